@@ -0,0 +1,119 @@
+from datetime import datetime, date
+import fcntl
+import gzip
+import json
+import os
+import threading
+
+class ReportArchive:
+  """
+  Append-only archive of the raw reports, partitioned by day and product:
+
+      <directory>/<YYYY-MM-DD>/<product>.gz    gzip segment
+      <directory>/<YYYY-MM-DD>/<product>.idx   one JSON line per block
+
+  Buffered reports are appended as one gzip member (block) per flush. A
+  concatenation of gzip members is a valid gzip file, so a segment can be
+  read with any gzip tool, and the index lets a replay read only the blocks
+  of the requested stations. Blocks are appended under an exclusive lock on
+  the segment, so overlapping runs writing the same day do not mix up offsets.
+
+  Args:
+      directory: root directory of the archive
+      flush_size: buffered reports that trigger a flush
+  """
+  def __init__(self, directory: str, flush_size: int = 1000):
+    self.directory = directory
+    self.flush_size = flush_size
+    self.pending = {}
+    self.lock = threading.Lock()
+    self.archived = 0
+
+  def add(self, product: str, station: str, raw: str, source: str, fetched: datetime = None):
+    fetched = fetched or datetime.now()
+    record = {"fetched": fetched.isoformat(), "product": product, "station": station, "source": source, "raw": raw}
+    with self.lock:
+      self.pending.setdefault((fetched.date(), product), []).append(record)
+      if sum(len(records) for records in self.pending.values()) < self.flush_size:
+        return
+    self.flush()
+
+  def flush(self):
+    with self.lock:
+      pending, self.pending = self.pending, {}
+      for (day, product), records in pending.items():
+        self.append_block(day, product, records)
+        self.archived += len(records)
+
+  def append_block(self, day: date, product: str, records: list[dict]):
+    path = os.path.join(self.directory, day.isoformat())
+    os.makedirs(path, exist_ok=True)
+    data = gzip.compress("".join(json.dumps(record) + "\n" for record in records).encode("utf-8"))
+    segment = os.path.join(path, f"{product}.gz")
+    with open(segment, "ab") as f:
+      # Held until the index entry is written, the lock is released when the file is closed
+      fcntl.flock(f, fcntl.LOCK_EX)
+      f.write(data)
+      f.flush()
+      # In append mode the block lands at the end of the file, wherever that was after other writers
+      offset = f.tell() - len(data)
+      entry = {
+        "offset": offset,
+        "length": len(data),
+        "count": len(records),
+        "first": records[0]["fetched"],
+        "last": records[-1]["fetched"],
+        "stations": sorted({record["station"] for record in records}),
+      }
+      # Written after the block, a block without index entry is only skipped by filtered replays
+      with open(os.path.join(path, f"{product}.idx"), "a", encoding="utf-8") as index:
+        index.write(json.dumps(entry) + "\n")
+
+  def summary(self) -> str:
+    return f"Archived {self.archived} reports in {self.directory}"
+
+def archive_days(directory: str, start: date = None, end: date = None) -> list[str]:
+  """
+  Day partitions of the archive in [start, end], oldest first.
+  """
+  days = []
+  for name in sorted(os.listdir(directory)):
+    try:
+      day = date.fromisoformat(name)
+    except ValueError:
+      continue
+    if (start is None or day >= start) and (end is None or day <= end):
+      days.append(name)
+  return days
+
+def read_archive(directory: str, product: str, start: date = None, end: date = None, stations: set[str] = None):
+  """
+  Stream the archived reports of a product, block by block.
+
+  Yields:
+      (raw report, fetch time), the fetch time is the reference date for parsing
+  """
+  for day in archive_days(directory, start, end):
+    segment = os.path.join(directory, day, f"{product}.gz")
+    if not os.path.exists(segment):
+      continue
+    index = os.path.join(directory, day, f"{product}.idx")
+    if stations is None or not os.path.exists(index):
+      with gzip.open(segment, "rt", encoding="utf-8") as f:
+        yield from select_records(f, stations)
+      continue
+    with open(index, encoding="utf-8") as f:
+      blocks = [json.loads(line) for line in f]
+    with open(segment, "rb") as f:
+      for block in blocks:
+        if stations.isdisjoint(block["stations"]):
+          continue
+        f.seek(block["offset"])
+        text = gzip.decompress(f.read(block["length"])).decode("utf-8")
+        yield from select_records(text.splitlines(), stations)
+
+def select_records(lines, stations: set[str] = None):
+  for line in lines:
+    record = json.loads(line)
+    if stations is None or record["station"] in stations:
+      yield record["raw"], datetime.fromisoformat(record["fetched"])
@@ -0,0 +1,100 @@
+from MetarTaf import parse_metar_conditions, parse_taf_conditions
+from Describe import render_metar, render_taf
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+import itertools
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+# Parse and render functions per product
+PARSERS = {
+  "METAR": (parse_metar_conditions, render_metar),
+  "TAF": (parse_taf_conditions, render_taf),
+}
+
+def read_reports(lines, reference: datetime = None):
+  """
+  Read raw reports, one per line. A line may start with an ISO timestamp
+  and a tab, which is used as reference date for that report.
+
+  Yields:
+      (raw report, reference datetime or None)
+  """
+  for line in lines:
+    stamp, sep, raw = line.rstrip("\r\n").partition("\t")
+    if not sep:
+      stamp, raw = None, stamp
+    raw = raw.strip()
+    if not raw:
+      continue
+    yield raw, datetime.fromisoformat(stamp) if stamp else reference
+
+def parse_chunk(product: str, chunk: list) -> tuple[int, list]:
+  """
+  Worker function, parses and renders the descriptions of a chunk of
+  (raw, reference) tuples. The parser instances live in the MetarTaf module,
+  so every worker process builds them only once.
+
+  A report that fails to parse or render counts as not parsed, the rest
+  of the chunk is parsed anyway.
+
+  Returns:
+      (number of reports in the chunk, list of parsed conditions)
+  """
+  parse, render = PARSERS[product]
+  results = []
+  for raw, reference in chunk:
+    if product == "TAF" and not raw.startswith("TAF"):
+      raw = "TAF " + raw
+    try:
+      conditions = parse(raw, reference)
+      if conditions:
+        results.append(render(conditions))
+    except Exception as e:
+      log.warning("Error parsing report", extra={"product": product, "error": str(e), "raw": raw})
+  return len(chunk), results
+
+def chunked(iterable, size: int):
+  iterator = iter(iterable)
+  while chunk := list(itertools.islice(iterator, size)):
+    yield chunk
+
+def run_backfill(reports, product: str, save, workers: int = None, chunk_size: int = 1000) -> tuple[int, int]:
+  """
+  Parse a stream of reports on a process pool and hand the results to save.
+
+  At most two chunks per worker are in flight, so memory stays bounded for
+  inputs of any size. Results are saved in completion order.
+
+  Args:
+      reports: iterable of (raw report, reference datetime)
+      product: "METAR" or "TAF"
+      save: callable receiving each parsed conditions object
+      workers: number of processes, defaults to the number of cores
+      chunk_size: reports sent to a worker at once
+
+  Returns:
+      (reports read, reports parsed)
+  """
+  workers = workers or os.cpu_count() or 1
+  totals = [0, 0]
+
+  def collect(done):
+    for future in done:
+      count, results = future.result()
+      totals[0] += count
+      totals[1] += len(results)
+      for conditions in results:
+        save(conditions)
+
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    pending = set()
+    for chunk in chunked(reports, chunk_size):
+      pending.add(executor.submit(parse_chunk, product, chunk))
+      if len(pending) >= workers * 2:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        collect(done)
+    collect(wait(pending).done)
+  return totals[0], totals[1]
@@ -0,0 +1,101 @@
+import asyncio
+import inspect
+import logging
+from pymongo.errors import OperationFailure, PyMongoError
+
+log = logging.getLogger(__name__)
+
+class ChangeFeed:
+  """
+  Follows new and updated documents of the condition collections with one
+  change stream per collection and fans them out to all subscribers of the
+  API process. Falls back to polling for new _ids when change streams are
+  not available (e.g. on a standalone mongod); in that mode only inserted
+  documents are seen.
+
+  Args:
+      db: Motor database
+      collections: names of the collections to follow
+      poll_interval: seconds between polls in polling mode
+  """
+  def __init__(self, db, collections: tuple[str, ...] = ("metar_conditions", "taf_conditions"),
+               poll_interval: float = 5):
+    self.db = db
+    self.collections = collections
+    self.poll_interval = poll_interval
+    self.listeners = []
+    self.tasks = []
+    self.modes = {}
+    self.events = 0
+
+  def subscribe(self, listener):
+    """
+    Register a listener called with (collection name, document) for every
+    new or updated document, may be a plain function or a coroutine.
+    """
+    self.listeners.append(listener)
+
+  async def start(self):
+    self.tasks = [asyncio.create_task(self.follow(name)) for name in self.collections]
+
+  async def stop(self):
+    for task in self.tasks:
+      task.cancel()
+    await asyncio.gather(*self.tasks, return_exceptions=True)
+    self.tasks = []
+
+  async def dispatch(self, collection_name: str, doc: dict):
+    self.events += 1
+    for listener in self.listeners:
+      try:
+        result = listener(collection_name, doc)
+        if inspect.isawaitable(result):
+          await result
+      except Exception as e:
+        log.exception("Change feed listener failed", extra={"collection": collection_name})
+
+  async def follow(self, collection_name: str):
+    try:
+      await self.watch(collection_name)
+    except OperationFailure as e:
+      log.warning("Change stream unavailable, polling", extra={"collection": collection_name, "error": str(e), "pollInterval": self.poll_interval})
+      await self.poll(collection_name)
+
+  async def watch(self, collection_name: str):
+    collection = self.db[collection_name]
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+    resume_token = None
+    while True:
+      try:
+        async with collection.watch(pipeline, full_document="updateLookup", resume_after=resume_token) as stream:
+          self.modes[collection_name] = "change stream"
+          async for change in stream:
+            resume_token = stream.resume_token
+            if change.get("fullDocument"):
+              await self.dispatch(collection_name, change["fullDocument"])
+      except OperationFailure:
+        if resume_token is None:
+          raise
+        # The resume token may have left the oplog, continue from now on
+        resume_token = None
+      except PyMongoError as e:
+        log.warning("Change stream interrupted", extra={"collection": collection_name, "error": str(e)})
+        await asyncio.sleep(1)
+
+  async def poll(self, collection_name: str):
+    collection = self.db[collection_name]
+    self.modes[collection_name] = "polling"
+    newest = await collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    last_id = newest["_id"] if newest else None
+    while True:
+      await asyncio.sleep(self.poll_interval)
+      try:
+        query = {"_id": {"$gt": last_id}} if last_id else {}
+        async for doc in collection.find(query, sort=[("_id", 1)]):
+          last_id = doc["_id"]
+          await self.dispatch(collection_name, doc)
+      except PyMongoError as e:
+        log.warning("Polling failed", extra={"collection": collection_name, "error": str(e)})
+
+  def stats(self) -> dict:
+    return {"modes": dict(self.modes), "events": self.events}
@@ -0,0 +1,96 @@
+from MetarTaf import MetarConditions, TAFConditions, TAFTrend
+
+# Bump whenever the wording changes, stored descriptions of an older version are rendered again
+RENDERER_VERSION = 1
+
+def describe_metar(metar: MetarConditions) -> str:
+  parts = []
+
+  if metar.station:
+      parts.append(f"At station {metar.station}")
+
+  if metar.issueTime:
+      parts.append(f"on {metar.issueTime.strftime('%Y-%m-%d')}")
+      parts.append(f"at {metar.issueTime.strftime('%H:%M')} UTC")
+
+  if metar.windSpeed is not None:
+      if metar.windDirection:
+          parts.append(f"the wind is blowing from {metar.windDirection} at {metar.windSpeed} knots")
+      else:
+          parts.append(f"the wind speed is {metar.windSpeed} knots")
+
+  if metar.visibility:
+      parts.append(f"with visibility of {metar.visibility}")
+
+  if metar.temperature is not None and metar.dewPoint is not None:
+      parts.append(f"and a temperature of {metar.temperature}°C with a dew point of {metar.dewPoint}°C")
+  elif metar.temperature is not None:
+      parts.append(f"and a temperature of {metar.temperature}°C")
+
+  return " ".join(parts) + "."
+
+def describe_trend(trend: TAFTrend) -> str:
+    start = trend.validityStart.strftime("%Y-%m-%d %H:%M UTC") if trend.validityStart else "unknown start"
+    end = trend.validityEnd.strftime("%Y-%m-%d %H:%M UTC") if trend.validityEnd else None
+
+    if end:
+        time_range = f"From {start} to {end},"
+    else:
+        time_range = f"Starting from {start},"
+
+    parts = [time_range]
+
+    if trend.windSpeed is not None:
+        if trend.windDirection:
+            parts.append(f"expect wind from {trend.windDirection} at {trend.windSpeed} knots")
+        else:
+            parts.append(f"expect wind at {trend.windSpeed} knots")
+
+    if trend.visibilityDistance:
+        parts.append(f"with visibility around {trend.visibilityDistance}")
+
+    if trend.cloudHeights:
+        cloud_text = ", ".join(f"{h} ft" for h in trend.cloudHeights)
+        parts.append(f"and clouds at {cloud_text}")
+
+    if len(parts) == 1:
+        parts.append("no significant weather changes expected.")
+
+    return " ".join(parts).capitalize()
+
+def describe_taf(taf: TAFConditions) -> str:
+    time_str = taf.issueTime.strftime("%Y-%m-%d %H:%M UTC") if taf.issueTime else "unknown time"
+    parts = [f"The TAF report for station {taf.station} was issued at {time_str}."]
+
+    if taf.windSpeed is not None:
+        if taf.windDirection:
+            parts.append(f"General forecast indicates wind from {taf.windDirection} at {taf.windSpeed} knots")
+        else:
+            parts.append(f"General forecast indicates wind at {taf.windSpeed} knots")
+
+    if taf.visibility:
+        parts.append(f"with visibility around {taf.visibility}")
+
+    if taf.maxTemperature is not None:
+        parts.append(f"maximum temperature of {taf.maxTemperature}°C")
+
+    if taf.minTemperature is not None:
+        parts.append(f"and a minimum of {taf.minTemperature}°C")
+
+    return " ".join(parts)
+
+def render_metar(metar: MetarConditions) -> MetarConditions:
+  """
+  Store the rendered description on the conditions, done by the scraper
+  before writing so the API does not render on every request.
+  """
+  metar.description = describe_metar(metar)
+  metar.descriptionVersion = RENDERER_VERSION
+  return metar
+
+def render_taf(taf: TAFConditions) -> TAFConditions:
+  taf.description = describe_taf(taf)
+  for trend in taf.trends:
+    trend.description = describe_trend(trend)
+  taf.descriptionVersion = RENDERER_VERSION
+  return taf
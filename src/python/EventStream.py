@@ -0,0 +1,85 @@
+import asyncio
+
+class EventStream:
+  """
+  Fans events out to Server-Sent Events subscribers of the API process.
+  Subscribers are indexed by station, so publishing an event only touches
+  the subscribers of its station. Every subscriber is a bounded queue, a
+  client that does not keep up is dropped instead of buffering without limit.
+
+  Args:
+      queue_size: events buffered per subscriber
+      keepalive: seconds without events after which a comment is sent
+  """
+  def __init__(self, queue_size: int = 100, keepalive: float = 15):
+    self.queue_size = queue_size
+    self.keepalive = keepalive
+    self.subscribers = {}
+    self.count = 0
+    self.published = 0
+    self.dropped = 0
+
+  def subscribe(self, stations: list[str]) -> asyncio.Queue:
+    queue = asyncio.Queue(self.queue_size)
+    for station in stations:
+      self.subscribers.setdefault(station, set()).add(queue)
+    self.count += 1
+    return queue
+
+  def unsubscribe(self, queue: asyncio.Queue, stations: list[str]):
+    for station in stations:
+      queues = self.subscribers.get(station)
+      if queues is not None and queue in queues:
+        queues.discard(queue)
+        if not queues:
+          del self.subscribers[station]
+    self.count -= 1
+
+  def has_subscribers(self, station: str) -> bool:
+    return station in self.subscribers
+
+  def publish(self, station: str, event: str, data: str):
+    """
+    Queue a serialized event for all subscribers of the station.
+    """
+    message = f"event: {event}\ndata: {data}\n\n"
+    for queue in list(self.subscribers.get(station, ())):
+      try:
+        queue.put_nowait(message)
+        self.published += 1
+      except asyncio.QueueFull:
+        # Too slow, the None tells the subscriber to close the connection,
+        # it unsubscribes itself on the way out
+        self.dropped += 1
+        while not queue.empty():
+          queue.get_nowait()
+        queue.put_nowait(None)
+
+  async def events(self, stations: list[str]):
+    """
+    Async generator of the SSE messages for one client, ends when the client
+    is dropped and unsubscribes when the client disconnects.
+    """
+    queue = self.subscribe(stations)
+    try:
+      # Tell the client how long to wait before reconnecting
+      yield "retry: 5000\n\n"
+      while True:
+        try:
+          message = await asyncio.wait_for(queue.get(), self.keepalive)
+        except asyncio.TimeoutError:
+          yield ": keepalive\n\n"
+          continue
+        if message is None:
+          return
+        yield message
+    finally:
+      self.unsubscribe(queue, stations)
+
+  def stats(self) -> dict:
+    return {
+      "subscribers": self.count,
+      "stations": len(self.subscribers),
+      "published": self.published,
+      "dropped": self.dropped
+    }
@@ -0,0 +1,163 @@
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from datetime import datetime, timedelta
+from Storage import metar_bucket_stages
+import argparse
+import logging
+import os
+import sys
+
+log = logging.getLogger(__name__)
+
+# Indexes backing the hot queries of the API and the scraper upserts
+INDEXES = {
+  "metar_conditions": [
+    ([("station", ASCENDING), ("issueTime", DESCENDING)], {"name": "station_issueTime", "unique": True}),
+  ],
+  "taf_conditions": [
+    ([("station", ASCENDING), ("issueTime", DESCENDING)], {"name": "station_issueTime", "unique": True}),
+  ],
+  "stations": [
+    ([("code", ASCENDING)], {"name": "code", "unique": True}),
+  ],
+}
+
+def ensure_indexes(db) -> list[str]:
+  """
+  Create all missing indexes. create_index is a no-op for existing indexes,
+  so this is safe to call on every start of the API and the scraper.
+
+  Returns:
+      list of problems, empty if all indexes exist
+  """
+  problems = []
+  for collection_name, indexes in INDEXES.items():
+    for keys, options in indexes:
+      try:
+        db[collection_name].create_index(keys, **options)
+      except OperationFailure as e:
+        # e.g. duplicates preventing a unique index, the other indexes are still created
+        problems.append(f"{collection_name}.{options['name']}: {e}")
+  for problem in problems:
+    log.warning("Could not create index", extra={"problem": problem})
+  return problems
+
+def index_status(db) -> dict[str, list[dict]]:
+  """
+  Compare the expected indexes with the existing ones.
+
+  Returns:
+      dict of collection name -> list of {name, keys, unique, present}
+  """
+  status = {}
+  for collection_name, indexes in INDEXES.items():
+    existing = {
+      tuple(info["key"]): info.get("unique", False)
+      for info in db[collection_name].index_information().values()
+    }
+    status[collection_name] = [
+      {
+        "name": options["name"],
+        "keys": keys,
+        "unique": options.get("unique", False),
+        "present": existing.get(tuple(keys)) == options.get("unique", False),
+      }
+      for keys, options in indexes
+    ]
+  return status
+
+def plan_stages(explain: dict) -> list[str]:
+  """
+  Collect all stage names of the winning plans in an explain() result,
+  for find and aggregate explains alike.
+  """
+  stages = []
+  def walk(node, in_plan: bool):
+    if isinstance(node, dict):
+      for key, value in node.items():
+        if key == "stage" and in_plan and isinstance(value, str):
+          stages.append(value)
+        walk(value, in_plan or key in ("winningPlan", "queryPlan"))
+    elif isinstance(node, list):
+      for value in node:
+        walk(value, in_plan)
+  walk(explain, False)
+  return stages
+
+def hot_queries(db, station: str) -> list[tuple[str, dict]]:
+  """
+  explain() of the queries issued by the API and the scraper for one station.
+
+  Returns:
+      list of (query name, explain result)
+  """
+  now = datetime.now()
+  since = now - timedelta(days=1)
+  # History requests usually ask for several stations, the second one only has to exist in the query
+  stations = [station, "ZZZZ"]
+  time_range = {"$gte": since, "$lt": now}
+  explains = []
+  for collection_name in ("metar_conditions", "taf_conditions"):
+    collection = db[collection_name]
+    explains.append((f"{collection_name} latest", db.command("aggregate", collection_name, pipeline=[
+      {"$match": {"station": {"$in": [station]}}},
+      {"$sort": {"station": 1, "issueTime": -1}},
+      {"$group": {"_id": "$station", "latest": {"$first": "$$ROOT"}}},
+    ], explain=True)))
+    explains.append((f"{collection_name} single latest",
+      collection.find({"station": station}).sort("issueTime", -1).limit(1).explain()))
+    # ReportApi.find_history_page, first and following pages
+    explains.append((f"{collection_name} history",
+      collection.find({"station": {"$in": stations}, "issueTime": time_range})
+        .sort([("station", 1), ("issueTime", -1)]).limit(501).explain()))
+    explains.append((f"{collection_name} history next page", collection.find({
+      "station": {"$in": stations}, "issueTime": time_range,
+      "$or": [{"station": station, "issueTime": {"$lt": now - timedelta(hours=12)}}, {"station": {"$gt": station}}],
+    }).sort([("station", 1), ("issueTime", -1)]).limit(501).explain()))
+    # ReportApi.export_lines
+    explains.append((f"{collection_name} export",
+      collection.find({"station": {"$in": stations}, "issueTime": time_range}, {"_id": 0})
+        .sort([("station", 1), ("issueTime", -1)]).explain()))
+    explains.append((f"{collection_name} upsert filter",
+      collection.find({"station": station, "issueTime": since}).explain()))
+  # ReportApi.aggregate_metar_buckets
+  explains.append(("metar_conditions aggregate", db.command("aggregate", "metar_conditions", pipeline=[
+    *metar_bucket_stages({"station": {"$in": stations}, "issueTime": time_range}, "hour", 1),
+    {"$sort": {"_id.station": 1, "_id.start": 1}},
+  ], explain=True)))
+  explains.append(("stations by code", db["stations"].find({"code": station}).explain()))
+  return explains
+
+def check_hot_queries(db, station: str) -> list[tuple[str, list[str]]]:
+  """
+  Returns:
+      list of (query name, plan stages) of all hot queries doing a COLLSCAN
+  """
+  return [
+    (name, stages)
+    for name, explain in hot_queries(db, station)
+    if "COLLSCAN" in (stages := plan_stages(explain))
+  ]
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Create and check the MongoDB indexes.")
+  parser.add_argument("--ensure", action="store_true", help="create missing indexes first")
+  parser.add_argument("--station", default="LOWW", help="station used for the explain() checks")
+  args = parser.parse_args()
+
+  client = MongoClient(os.environ.get("MONGO_URI", "mongodb://localhost:27017"))
+  db = client["aviation"]
+  if args.ensure:
+    ensure_indexes(db)
+  for collection_name, indexes in index_status(db).items():
+    for index in indexes:
+      print(f"{collection_name:<18} {index['name']:<20} {'present' if index['present'] else 'MISSING'}")
+  collscans = []
+  for name, explain in hot_queries(db, args.station):
+    stages = plan_stages(explain)
+    print(f"{name:<34} {' <- '.join(stages)}")
+    if "COLLSCAN" in stages:
+      collscans.append(name)
+  if collscans:
+    print(f"{len(collscans)} hot queries do a COLLSCAN.")
+    sys.exit(1)
@@ -1,26 +1,58 @@
 from metar_taf_parser.parser.parser import MetarParser, FMValidity, TAFParser
 from datetime import datetime, timedelta, time
+from collections import OrderedDict
+from fractions import Fraction
+import copy
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
+
+# The parsers keep no state between calls, build them once per process
+metar_parser = MetarParser()
+taf_parser = TAFParser()
 
 def strip_mongo_id(doc):
     doc = dict(doc)
     doc.pop("_id", None)
     return doc
 
+def fields_to_dict(obj, fields: tuple) -> dict:
+  """
+  Dictionary of all fields of a __slots__ object which are not None.
+  """
+  result = {}
+  for field in fields:
+    value = getattr(obj, field)
+    if value is not None:
+      result[field] = value
+  return result
+
 class StationInfo:
+  FIELDS = ("code", "name")
+  __slots__ = FIELDS
+
   def __init__(self, code=None, name=None):
     self.code = code
     self.name = name
 
   def to_dict(self):
-    return {k: v for k, v in self.__dict__.items() if v is not None}
+    return fields_to_dict(self, StationInfo.FIELDS)
 
   @staticmethod
   def from_dict(data):
-    return StationInfo(**strip_mongo_id(data))
+    return StationInfo(*map(data.get, StationInfo.FIELDS))
 
 class MetarConditions:
+  FIELDS = ("station", "issueTime", "windSpeed", "windDirection", "windDegrees",
+            "temperature", "dewPoint", "visibility", "description", "descriptionVersion",
+            "visibilityMeters")
+  __slots__ = FIELDS
+
   def __init__(self, station=None, issueTime=None, windSpeed=None, windDirection=None,
-                windDegrees=None, temperature=None, dewPoint=None, visibility=None):
+                windDegrees=None, temperature=None, dewPoint=None, visibility=None,
+                description=None, descriptionVersion=None, visibilityMeters=None):
       self.station = station
       self.issueTime = issueTime
       self.windSpeed = windSpeed
@@ -29,19 +61,29 @@ class MetarConditions:
       self.temperature = temperature
       self.dewPoint = dewPoint
       self.visibility = visibility
+      # Rendered by Describe.render_metar
+      self.description = description
+      self.descriptionVersion = descriptionVersion
+      # Numeric visibility for aggregations, visibility keeps the reported text
+      self.visibilityMeters = visibilityMeters
 
   # Dictionary representation for easier output and storage
   def to_dict(self):
-    return {k: v for k, v in self.__dict__.items() if v is not None}
+    return fields_to_dict(self, MetarConditions.FIELDS)
   
   @staticmethod
   def from_dict(data):
-      return MetarConditions(**strip_mongo_id(data))
+      # Reads the fields straight from the (Mongo) document, _id and unknown keys are ignored
+      return MetarConditions(*map(data.get, MetarConditions.FIELDS))
 
 class TAFTrend:
+  FIELDS = ("validityStart", "validityEnd", "visibilityDistance", "cloudHeights",
+            "windSpeed", "windDirection", "windDegrees", "description")
+  __slots__ = FIELDS
+
   def __init__(self, validityStart=None, validityEnd=None, visibilityDistance=None,
                 cloudHeights: list[int] = None, windSpeed=None, windDirection=None,
-                windDegrees=None):
+                windDegrees=None, description=None):
     self.validityStart = validityStart
     self.validityEnd = validityEnd
     self.visibilityDistance = visibilityDistance
@@ -49,27 +91,25 @@ class TAFTrend:
     self.windSpeed = windSpeed
     self.windDirection = windDirection
     self.windDegrees = windDegrees
+    self.description = description
 
   def to_dict(self):
-    raw =  {
-        "validityStart": self.validityStart,
-        "validityEnd": self.validityEnd,
-        "visibilityDistance": self.visibilityDistance,
-        "cloudHeights": self.cloudHeights,
-        "windSpeed": self.windSpeed,
-        "windDirection": self.windDirection,
-        "windDegrees": self.windDegrees
-    }
-    return {k: v for k, v in raw.items() if v is not None}
+    return fields_to_dict(self, TAFTrend.FIELDS)
   
   @staticmethod
   def from_dict(data):
-      return TAFTrend(**strip_mongo_id(data))
+      return TAFTrend(*map(data.get, TAFTrend.FIELDS))
 
 class TAFConditions:
+  FIELDS = ("station", "issueTime", "maxTemperature", "minTemperature", "windSpeed",
+            "windDirection", "windDegrees", "visibility", "description", "descriptionVersion",
+            "validityStart", "validityEnd")
+  __slots__ = FIELDS + ("trends",)
+
   def __init__(self, station=None, issueTime=None, maxTemperature=None, minTemperature=None,
                windSpeed=None, windDirection=None, windDegrees=None, visibility=None,
-               trends: list[TAFTrend] = None):
+               description=None, descriptionVersion=None, trends: list[TAFTrend] = None,
+               validityStart=None, validityEnd=None):
     self.station = station
     self.issueTime = issueTime
     self.maxTemperature = maxTemperature
@@ -78,35 +118,25 @@ class TAFConditions:
     self.windDirection = windDirection
     self.windDegrees = windDegrees
     self.visibility = visibility
+    # Rendered by Describe.render_taf
+    self.description = description
+    self.descriptionVersion = descriptionVersion
     self.trends = trends or []
+    # Validity period of the whole TAF, amendments share the end of the TAF they replace
+    self.validityStart = validityStart
+    self.validityEnd = validityEnd
 
   def to_dict(self):
-    raw =  {
-        "station": self.station,
-        "issueTime": self.issueTime,
-        "maxTemperature": self.maxTemperature,
-        "minTemperature": self.minTemperature,
-        "windSpeed": self.windSpeed,
-        "windDirection": self.windDirection,
-        "windDegrees": self.windDegrees,
-        "visibility": self.visibility,
-        "trends": [trend.to_dict() for trend in self.trends] if self.trends else []
-    }
-    return {k: v for k, v in raw.items() if v is not None}
+    raw = fields_to_dict(self, TAFConditions.FIELDS)
+    raw["trends"] = [trend.to_dict() for trend in self.trends] if self.trends else []
+    return raw
 
   @staticmethod
   def from_dict(data):
-     return TAFConditions(
-         station=data.get("station"),
-         issueTime=data.get("issueTime"),
-         maxTemperature=data.get("maxTemperature"),
-         minTemperature=data.get("minTemperature"),
-         windSpeed=data.get("windSpeed"),
-         windDirection=data.get("windDirection"),
-         windDegrees=data.get("windDegrees"),
-         visibility=data.get("visibility"),
-         trends=[TAFTrend.from_dict(trend) for trend in data.get("trends", [])]
-     )
+     conditions = TAFConditions(**{field: data.get(field) for field in TAFConditions.FIELDS})
+     conditions.trends = [TAFTrend.from_dict(trend) for trend in data.get("trends", [])]
+     return conditions
+
   
 def output_metar_conditions(conditions: 'MetarConditions'):
   if not conditions:
@@ -136,6 +166,41 @@ def output_taf_conditions(conditions: 'TAFConditions'):
     print(f"  Cloud Heights: {trend.cloudHeights}")
     print(f"  Wind: {trend.windDirection} ({trend.windDegrees}°) at {trend.windSpeed} kt")
 
+# Meters per unit of a reported visibility distance
+LENGTH_UNIT_METERS = {"M": 1, "FT": 0.3048, "SM": 1609.344}
+
+def visibility_to_meters(distance: str, unit) -> float:
+  """
+  Convert a visibility distance like "9999", ">10000", "1 1/2" or "M1/4"
+  to meters. Greater/less than markers are dropped.
+
+  Returns:
+      meters or None if the distance is not numeric
+  """
+  if not distance or unit is None or unit.value not in LENGTH_UNIT_METERS:
+    return None
+  try:
+    value = sum(Fraction(part) for part in distance.lstrip("<>PM").split())
+  except (ValueError, ZeroDivisionError):
+    return None
+  return round(float(value * LENGTH_UNIT_METERS[unit.value]), 1)
+
+def resolve_report_day(reference: datetime, day: int) -> datetime:
+  """
+  The reference moved to the given day of month. Reports only carry the
+  day, so the closest date with that day around the reference month is
+  taken, e.g. day 31 with a reference on February 1 is January 31 and with
+  a reference on March 1 (February has no 31st) January 31 as well.
+  """
+  candidates = []
+  for months in (-2, -1, 0, 1):
+    year, month = divmod(reference.year * 12 + reference.month - 1 + months, 12)
+    try:
+      candidates.append(reference.replace(year=year, month=month + 1, day=day))
+    except ValueError:
+      continue
+  return min(candidates, key=lambda candidate: abs(candidate - reference))
+
 def validity_to_datetimes(validity, reference: datetime) -> tuple[datetime, datetime]:
   """
   Convert Validity[start_day, start_hour, end_day, end_hour] into actual datetimes
@@ -149,9 +214,8 @@ def validity_to_datetimes(validity, reference: datetime) -> tuple[datetime, date
       (start_datetime, end_datetime)
   """
   def resolve(day: int, hour: int) -> datetime:
-      base = reference.replace(hour=hour, minute=0, second=0, microsecond=0)
-      day_diff = (day - reference.day) % 31  # naive wrap handling
-      return base + timedelta(days=day_diff)
+    # Closest date with that day, so validities running into the next month end there
+    return resolve_report_day(reference, day).replace(hour=hour, minute=0, second=0, microsecond=0)
 
   start_dt = resolve(validity.start_day, validity.start_hour)
   # Check if validity is of class FMValidity
@@ -170,12 +234,115 @@ def validity_to_datetimes(validity, reference: datetime) -> tuple[datetime, date
 
   return start_dt, end_dt
 
-def parse_metar_conditions(s):
+class ParseCache:
+  """
+  Bounded, thread safe LRU cache of parsed reports keyed on the normalized
+  raw text and the reference date. Stores the parsed objects and hands out
+  deep copies, so callers can modify their result freely.
+  """
+  def __init__(self, size: int):
+    self.size = size
+    self.entries = OrderedDict()
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def get(self, key):
+    """
+    Returns:
+        (True, copy of the cached value) or (False, None)
+    """
+    with self.lock:
+      if key not in self.entries:
+        self.misses += 1
+        return False, None
+      self.entries.move_to_end(key)
+      self.hits += 1
+      value = self.entries[key]
+    return True, copy.deepcopy(value)
+
+  def put(self, key, value):
+    value = copy.deepcopy(value)
+    with self.lock:
+      self.entries[key] = value
+      self.entries.move_to_end(key)
+      while len(self.entries) > self.size:
+        self.entries.popitem(last=False)
+        self.evictions += 1
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+
+  def stats(self) -> dict:
+    with self.lock:
+      return {
+        "size": len(self.entries),
+        "maxSize": self.size,
+        "hits": self.hits,
+        "misses": self.misses,
+        "evictions": self.evictions
+      }
+
+parse_cache = None
+
+def configure_parse_cache(size: int):
+  """
+  Enable the parse cache with the given number of entries, 0 disables it.
+  """
+  global parse_cache
+  parse_cache = ParseCache(size) if size > 0 else None
+
+configure_parse_cache(int(os.environ.get("PARSE_CACHE_SIZE", "0")))
+
+def cached_parse(product: str, parse, s, reference: datetime):
+  if parse_cache is None:
+    return parse(s, reference)
+  # The report's own time replaces the time of the reference, only its date
+  # matters. Without reference the parsers anchor the report on the current date.
+  key = (product, " ".join(s.split()), (reference or datetime.now()).date())
+  found, conditions = parse_cache.get(key)
+  if not found:
+    conditions = parse(s, reference)
+    parse_cache.put(key, conditions)
+  return conditions
+
+def parse_metar_conditions(s, reference: datetime = None):
+  """
+  Parse METAR conditions from a METAR string, through the parse cache if
+  it is enabled.
+
+  Args:
+      s: METAR string
+      reference: datetime anchoring year/month/day of the report, defaults to now
+
+  Returns:
+      MetarConditions object with parsed data
+  """
+  return cached_parse("METAR", parse_metar_uncached, s, reference)
+
+def parse_taf_conditions(s, reference: datetime = None):
+  """
+  Parse TAF conditions from a TAF string, through the parse cache if it
+  is enabled.
+
+  Args:
+      s: TAF string
+      reference: datetime anchoring year/month/day of the report, defaults to now
+
+  Returns:
+      TAFConditions object with parsed data
+  """
+  return cached_parse("TAF", parse_taf_uncached, s, reference)
+
+def parse_metar_uncached(s, reference: datetime = None):
   """
   Parse METAR conditions from a METAR string.
 
   Args:
       s: METAR string
+      reference: datetime anchoring year/month/day of the report, defaults to now
 
   Returns:
       MetarConditions object with parsed data
@@ -183,14 +350,13 @@ def parse_metar_conditions(s):
 
   conditions = MetarConditions()
   try:
-      metar = MetarParser().parse(s)
+      metar = metar_parser.parse(s)
   except Exception as e:
-      print(f"Error parsing METAR: {e}")
-      print(f"Raw METAR string: {s}")
+      log.warning("Error parsing METAR", extra={"error": str(e), "raw": s})
       return None
 
   conditions.station = metar.station
-  conditions.issueTime = datetime.now()  # Use current time as issue time
+  conditions.issueTime = reference or datetime.now()  # Use current time as issue time
   if metar.time:
     # metar.time is a datetime.time, set the time in conditions.issueTime
     conditions.issueTime = conditions.issueTime.replace(
@@ -201,8 +367,8 @@ def parse_metar_conditions(s):
     )
 
   if metar.day:
-    # If metar.day is provided, adjust the day in issueTime
-    conditions.issueTime = conditions.issueTime.replace(day=metar.day)
+    # The day may belong to the previous month, e.g. a report of the 31st parsed on the 1st
+    conditions.issueTime = resolve_report_day(conditions.issueTime, metar.day)
 
   conditions.windSpeed = metar.wind.speed
   conditions.windDirection = metar.wind.direction
@@ -210,15 +376,18 @@ def parse_metar_conditions(s):
   conditions.temperature = metar.temperature
   conditions.dewPoint = metar.dew_point
   conditions.visibility = metar.visibility.distance if metar.visibility else None
+  if metar.visibility:
+    conditions.visibilityMeters = visibility_to_meters(metar.visibility.distance, metar.visibility.unit)
 
   return conditions
 
-def parse_taf_conditions(s):
+def parse_taf_uncached(s, reference: datetime = None):
   """
   Parse TAF conditions from a TAF string.
 
   Args:
       s: TAF string
+      reference: datetime anchoring year/month/day of the report, defaults to now
 
   Returns:
       TAFConditions object with parsed data
@@ -226,16 +395,16 @@ def parse_taf_conditions(s):
 
   conditions = TAFConditions()
   try:
-    taf = TAFParser().parse(s)
+    taf = taf_parser.parse(s)
   except Exception as e:
-    print(f"Error parsing TAF: {e}")
-    print(f"Raw TAF string: {s}")
+    log.warning("Error parsing TAF", extra={"error": str(e), "raw": s})
     return None
   conditions.station = taf.station
-  d = datetime.now() 
-  d.replace(day=taf.day)
+  d = reference or datetime.now()
   hour, minute, second = map(int, str(taf.time).split(":"))
   d = d.replace(hour=hour, minute=minute, second=second, microsecond=0)
+  if taf.day:
+    d = resolve_report_day(d, taf.day)
 
   conditions.issueTime = d
   conditions.maxTemperature = taf.max_temperature.temperature if taf.max_temperature else None
@@ -244,6 +413,8 @@ def parse_taf_conditions(s):
   conditions.windDirection = taf.wind.direction if taf.wind else None
   conditions.windDegrees = taf.wind.degrees if taf.wind else None
   conditions.visibility = taf.visibility.distance if taf.visibility else None
+  if taf.validity:
+    conditions.validityStart, conditions.validityEnd = validity_to_datetimes(taf.validity, d)
   conditions.trends = []
 
   for trend in taf.trends:
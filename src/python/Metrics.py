@@ -0,0 +1,181 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest, push_to_gateway, start_http_server
+from pymongo import monitoring
+
+log = logging.getLogger(__name__)
+
+# Attributes every LogRecord has, everything else was passed as extra
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+class JsonFormatter(logging.Formatter):
+  """
+  One JSON object per line with time, level, logger and message plus the
+  fields passed as extra, e.g. log.info("Cycle finished", extra={"parsed": 12}).
+  """
+  def format(self, record: logging.LogRecord) -> str:
+    entry = {
+      "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+      "level": record.levelname,
+      "logger": record.name,
+      "message": record.getMessage(),
+    }
+    entry.update((key, value) for key, value in vars(record).items() if key not in STANDARD_ATTRIBUTES)
+    if record.exc_info:
+      entry["exception"] = self.formatException(record.exc_info)
+    return json.dumps(entry, default=str)
+
+def configure_logging():
+  """
+  Log to stderr as JSON lines (LOG_FORMAT=json, the default) or plain text
+  (LOG_FORMAT=text) at LOG_LEVEL (default INFO).
+  """
+  handler = logging.StreamHandler()
+  if os.environ.get("LOG_FORMAT", "json").lower() == "text":
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+  else:
+    handler.setFormatter(JsonFormatter())
+  root = logging.getLogger()
+  root.handlers = [handler]
+  root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+  # uvicorn configures its loggers before it imports the app, route them through the same handler
+  for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+    logging.getLogger(name).handlers = []
+    logging.getLogger(name).propagate = True
+
+# Bulk writes of the scraper, backfills and migrations
+WRITE_SECONDS = Histogram("mongo_bulk_write_seconds", "Duration of a bulk write of buffered reports", ["collection"])
+COMMAND_SECONDS = Histogram("mongo_command_seconds", "Duration of MongoDB commands", ["command"])
+
+# API metrics per method and endpoint, see MetricsMiddleware
+REQUEST_SECONDS = Histogram("api_request_seconds", "Request latency until the response is sent", ["method", "endpoint", "status"])
+DB_SECONDS = Histogram("api_db_seconds", "MongoDB time per request", ["method", "endpoint"])
+SERIALIZATION_SECONDS = Histogram("api_serialization_seconds", "Response model and JSON time per request", ["method", "endpoint"])
+CACHE_LOOKUPS = Counter("api_cache_lookups", "Latest-report cache lookups", ["method", "endpoint", "result"])
+# Server-Sent Events stay open for minutes or hours, they would only fill the +Inf bucket of api_request_seconds
+STREAM_SECONDS = Histogram("api_stream_seconds", "Lifetime of streaming (text/event-stream) connections", ["endpoint"],
+                           buckets=(1, 10, 60, 300, 900, 1800, 3600, 4 * 3600, 12 * 3600, 24 * 3600))
+
+class RequestTimings:
+  """
+  Time spent in MongoDB and in serialization plus the cache lookups of one
+  API request, collected while the request runs and observed per endpoint
+  when it is finished.
+  """
+  __slots__ = ("db", "serialization", "cache_hits", "cache_misses")
+
+  def __init__(self):
+    self.db = 0.0
+    self.serialization = 0.0
+    self.cache_hits = 0
+    self.cache_misses = 0
+
+request_timings: ContextVar[RequestTimings] = ContextVar("request_timings", default=None)
+
+@contextmanager
+def serialization_time():
+  """
+  Add the duration of the block to the serialization time of the current request.
+  """
+  start = time.perf_counter()
+  try:
+    yield
+  finally:
+    timings = request_timings.get()
+    if timings is not None:
+      timings.serialization += time.perf_counter() - start
+
+class MongoCommandMetrics(monitoring.CommandListener):
+  """
+  pymongo command listener observing the duration of every command and
+  adding it to the DB time of the current request. Motor runs the commands
+  on worker threads with a copy of the caller's context, so the request is
+  known there as well.
+  """
+  def started(self, event):
+    pass
+
+  def succeeded(self, event):
+    self.observe(event)
+
+  def failed(self, event):
+    self.observe(event)
+
+  def observe(self, event):
+    seconds = event.duration_micros / 1e6
+    COMMAND_SECONDS.labels(event.command_name).observe(seconds)
+    timings = request_timings.get()
+    if timings is not None:
+      timings.db += seconds
+
+class MetricsMiddleware:
+  """
+  ASGI middleware observing latency, DB time, serialization time and cache
+  lookups per endpoint. The endpoint is the path template of the matched
+  route (e.g. /metar/{station}), so the label set stays small. Streaming
+  responses only observe their connection lifetime in api_stream_seconds.
+  """
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+    timings = RequestTimings()
+    token = request_timings.set(timings)
+    status = 500
+    streaming = False
+    async def send_status(message):
+      nonlocal status, streaming
+      if message["type"] == "http.response.start":
+        status = message["status"]
+        streaming = any(name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+                        for name, value in message.get("headers", []))
+      await send(message)
+    start = time.perf_counter()
+    try:
+      await self.app(scope, receive, send_status)
+    finally:
+      request_timings.reset(token)
+      route = scope.get("route")
+      # Unmatched paths share one label instead of one per scanned URL
+      labels = (scope["method"], route.path if route else "unmatched")
+      if streaming:
+        STREAM_SECONDS.labels(labels[1]).observe(time.perf_counter() - start)
+        return
+      REQUEST_SECONDS.labels(*labels, str(status)).observe(time.perf_counter() - start)
+      DB_SECONDS.labels(*labels).observe(timings.db)
+      SERIALIZATION_SECONDS.labels(*labels).observe(timings.serialization)
+      if timings.cache_hits:
+        CACHE_LOOKUPS.labels(*labels, "hit").inc(timings.cache_hits)
+      if timings.cache_misses:
+        CACHE_LOOKUPS.labels(*labels, "miss").inc(timings.cache_misses)
+
+def metrics_response() -> tuple[bytes, str]:
+  """
+  Body and content type of a Prometheus scrape.
+  """
+  return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+def serve_metrics(port: int):
+  """
+  Serve /metrics on a background thread, for long running processes.
+  """
+  start_http_server(port)
+  log.info("Serving metrics", extra={"port": port})
+
+def push_metrics(gateway: str, job: str):
+  """
+  Push all metrics to a Pushgateway, for short lived processes like
+  CronJobs. A failed push is logged and does not fail the job.
+  """
+  try:
+    push_to_gateway(gateway, job=job, registry=REGISTRY)
+  except OSError as e:
+    log.warning("Pushing metrics failed", extra={"gateway": gateway, "error": str(e)})
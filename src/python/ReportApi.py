@@ -1,16 +1,49 @@
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Request, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from bson.json_util import dumps
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+import asyncio
 import uvicorn
 import os
 import json
+import base64
+import binascii
+import zlib
+import hashlib
+import re
 from MetarTaf import *
-
-app = FastAPI()
+from Describe import RENDERER_VERSION, render_metar, render_taf
+from Indexes import ensure_indexes
+from ChangeFeed import ChangeFeed
+from ResponseCache import ResponseCache
+from Storage import AGGREGATE_FIELDS, ensure_timeseries, history_collection_name, metar_bucket_stages, storage_mode
+from EventStream import EventStream
+from Metrics import MetricsMiddleware, MongoCommandMetrics, configure_logging, metrics_response, request_timings, serialization_time
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+  # Index creation is a one-off, run it on the synchronous driver underneath Motor
+  await asyncio.to_thread(ensure_indexes, db.delegate)
+  if metar_storage == "timeseries":
+    await asyncio.to_thread(ensure_timeseries, db.delegate)
+  await change_feed.start()
+  yield
+  await change_feed.stop()
+
+configure_logging()
+
+class TimedJSONResponse(JSONResponse):
+  # Rendering the JSON counts as serialization time of the request
+  def render(self, content) -> bytes:
+    with serialization_time():
+      return super().render(content)
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,18 +51,75 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+# Outermost, so the latency includes the other middlewares
+app.add_middleware(MetricsMiddleware)
 
 
 # Read Mongo URI from env variable
 mongo_uri = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(mongo_uri)
+mongo_timeout_ms = int(os.environ.get("MONGO_TIMEOUT_MS", "5000"))
+client = AsyncIOMotorClient(
+  mongo_uri,
+  maxPoolSize=int(os.environ.get("MONGO_MAX_POOL_SIZE", "100")),
+  minPoolSize=int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")),
+  serverSelectionTimeoutMS=mongo_timeout_ms,
+  connectTimeoutMS=mongo_timeout_ms,
+  socketTimeoutMS=int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+  event_listeners=[MongoCommandMetrics()]
+)
 db = client["aviation"]
+metar_storage = storage_mode()
+
+def history_collection(product: str):
+  # Reports in a time range, the latest reports are always read from the condition collections
+  return db[history_collection_name(product, metar_storage)]
+
+# Ready-to-serve latest response per (product, station), invalidated by the scraper writes
+latest_cache = ResponseCache(
+  int(os.environ.get("RESPONSE_CACHE_SIZE", "2000")),
+  float(os.environ.get("RESPONSE_CACHE_TTL", "300"))
+)
+change_feed = ChangeFeed(db, poll_interval=float(os.environ.get("CHANGE_FEED_POLL_INTERVAL", "5")))
+COLLECTION_PRODUCTS = {"metar_conditions": "METAR", "taf_conditions": "TAF"}
+
+def invalidate_latest(collection_name: str, doc: dict):
+  latest_cache.invalidate((COLLECTION_PRODUCTS[collection_name], doc.get("station")))
+
+change_feed.subscribe(invalidate_latest)
+
+# Server-Sent Events of new reports, fed by the same change feed
+event_stream = EventStream(
+  int(os.environ.get("STREAM_QUEUE_SIZE", "100")),
+  float(os.environ.get("STREAM_KEEPALIVE", "15"))
+)
+
+# Upper bound of documents per history page
+history_max_page_size = int(os.environ.get("HISTORY_MAX_PAGE_SIZE", "500"))
+
+# Upper bound of buckets per station of an aggregation
+aggregate_max_buckets = int(os.environ.get("AGGREGATE_MAX_BUCKETS", "10000"))
+
+# Seconds clients may reuse a response without revalidating it, the scraper runs every 5 minutes
+cache_max_age = int(os.environ.get("CACHE_MAX_AGE", "300"))
+stations_cache_max_age = int(os.environ.get("STATIONS_CACHE_MAX_AGE", "60"))
 
 
 class DTORequest(BaseModel):
   stations: List[str]
   startTime: Optional[datetime] = None
+  # History paging, see find_history_page
+  endTime: Optional[datetime] = None
+  cursor: Optional[str] = None
+  limit: Optional[int] = None
+
+class DTOAggregateRequest(BaseModel):
+  stations: List[str]
+  startTime: datetime
+  endTime: Optional[datetime] = None
+  # "hour", "day" or a number with m, h or d, e.g. "15m" or "6h"
+  interval: str = "hour"
 
 class DTOMetarResponse(BaseModel):
   description: str
@@ -43,7 +133,8 @@ class DTOStationInfo(BaseModel):
 class DTOTafTrend(BaseModel):
   description: str
   validityStart: datetime
-  validityEnd: datetime
+  # FM trends have no end, they last until the next trend
+  validityEnd: Optional[datetime] = None
 
 class DTOTafResponse(BaseModel):
   description: str
@@ -52,177 +143,457 @@ class DTOTafResponse(BaseModel):
   trends: List[DTOTafTrend]
 
 def createMetarReponse(metar: MetarConditions) -> DTOMetarResponse:
-  parts = []
-
-  if metar.station:
-      parts.append(f"At station {metar.station}")
-
-  if metar.issueTime:
-      parts.append(f"on {metar.issueTime.strftime('%Y-%m-%d')}")
-      parts.append(f"at {metar.issueTime.strftime('%H:%M')} UTC")
-
-  if metar.windSpeed is not None:
-      if metar.windDirection:
-          parts.append(f"the wind is blowing from {metar.windDirection} at {metar.windSpeed} knots")
-      else:
-          parts.append(f"the wind speed is {metar.windSpeed} knots")
-
-  if metar.visibility:
-      parts.append(f"with visibility of {metar.visibility}")
-
-  if metar.temperature is not None and metar.dewPoint is not None:
-      parts.append(f"and a temperature of {metar.temperature}°C with a dew point of {metar.dewPoint}°C")
-  elif metar.temperature is not None:
-      parts.append(f"and a temperature of {metar.temperature}°C")
-
-  sentence = " ".join(parts) + "."
+  # Stored descriptions are rendered by the scraper, only outdated ones are rendered here
+  if metar.descriptionVersion != RENDERER_VERSION:
+    render_metar(metar)
   return DTOMetarResponse(
-      description=sentence,
+      description=metar.description,
       issueTime=metar.issueTime,
       station=metar.station
   )
 
-def describe_trend(trend: TAFTrend) -> str:
-    start = trend.validityStart.strftime("%Y-%m-%d %H:%M UTC") if trend.validityStart else "unknown start"
-    end = trend.validityEnd.strftime("%Y-%m-%d %H:%M UTC") if trend.validityEnd else None
-
-    if end:
-        time_range = f"From {start} to {end},"
-    else:
-        time_range = f"Starting from {start},"
-
-    parts = [time_range]
-
-    if trend.windSpeed is not None:
-        if trend.windDirection:
-            parts.append(f"expect wind from {trend.windDirection} at {trend.windSpeed} knots")
-        else:
-            parts.append(f"expect wind at {trend.windSpeed} knots")
-
-    if trend.visibilityDistance:
-        parts.append(f"with visibility around {trend.visibilityDistance}")
-
-    if trend.cloudHeights:
-        cloud_text = ", ".join(f"{h} ft" for h in trend.cloudHeights)
-        parts.append(f"and clouds at {cloud_text}")
-
-    if len(parts) == 1:
-        parts.append("no significant weather changes expected.")
-
-    return " ".join(parts).capitalize()
-
 def create_taf_response(taf: TAFConditions) -> DTOTafResponse:
-    time_str = taf.issueTime.strftime("%Y-%m-%d %H:%M UTC") if taf.issueTime else "unknown time"
-    parts = [f"The TAF report for station {taf.station} was issued at {time_str}."]
-
-    if taf.windSpeed is not None:
-        if taf.windDirection:
-            parts.append(f"General forecast indicates wind from {taf.windDirection} at {taf.windSpeed} knots")
-        else:
-            parts.append(f"General forecast indicates wind at {taf.windSpeed} knots")
-
-    if taf.visibility:
-        parts.append(f"with visibility around {taf.visibility}")
-
-    if taf.maxTemperature is not None:
-        parts.append(f"maximum temperature of {taf.maxTemperature}°C")
-
-    if taf.minTemperature is not None:
-        parts.append(f"and a minimum of {taf.minTemperature}°C")
-
-    description = " ".join(parts)
+    if taf.descriptionVersion != RENDERER_VERSION:
+      render_taf(taf)
 
     dto_trends = []
     for trend in taf.trends:
-        trend_description = describe_trend(trend)
         dto_trends.append(DTOTafTrend(
-            description=trend_description,
+            description=trend.description,
             validityStart=trend.validityStart,
             validityEnd=trend.validityEnd
         ))
 
     return DTOTafResponse(
-        description=description,
+        description=taf.description,
         issueTime=taf.issueTime,
         station=taf.station,
         trends=dto_trends
     )
 
+def build_metar_response(doc: dict) -> DTOMetarResponse:
+  return createMetarReponse(MetarConditions.from_dict(doc))
 
-@app.get("/metar/{station}")
-def get_metar(station: str):
-    metar_data = db.metar_conditions.find_one(
-      {"station": station},
-      sort=[("issueTime", -1)]
+def build_taf_response(doc: dict) -> DTOTafResponse:
+  return create_taf_response(TAFConditions.from_dict(doc))
+
+# Only the fields the DTOs and the renderer need are read for history queries
+METAR_PROJECTION = {field: 1 for field in MetarConditions.FIELDS if field not in ("windDegrees", "visibilityMeters")}
+TAF_PROJECTION = dict(
+  {field: 1 for field in TAFConditions.FIELDS if field not in ("windDegrees", "validityStart", "validityEnd")},
+  **{f"trends.{field}": 1 for field in TAFTrend.FIELDS if field != "windDegrees"}
+)
+
+# Collection, response builder and history projection per product
+PRODUCTS = {
+  "METAR": ("metar_conditions", build_metar_response, METAR_PROJECTION),
+  "TAF": ("taf_conditions", build_taf_response, TAF_PROJECTION),
+}
+
+async def find_latest(collection, stations: list[str]) -> dict[str, dict]:
+  """
+  Fetch the latest document of all stations with a single aggregation.
+
+  Returns:
+      dict of station -> latest document, stations without data are missing
+  """
+  cursor = collection.aggregate([
+    {"$match": {"station": {"$in": stations}}},
+    {"$sort": {"station": 1, "issueTime": -1}},
+    {"$group": {"_id": "$station", "latest": {"$first": "$$ROOT"}}},
+    {"$replaceRoot": {"newRoot": "$latest"}}
+  ])
+  return {doc["station"]: doc async for doc in cursor}
+
+def encode_cursor(station: str, issue_time: datetime) -> str:
+  raw = json.dumps([station, issue_time.isoformat()])
+  return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[str, datetime]:
+  try:
+    station, issue_time = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(station, str):
+      raise TypeError(station)
+    return station, datetime.fromisoformat(issue_time)
+  except (ValueError, TypeError, binascii.Error):
+    raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+async def find_history_page(collection, stations: list[str], start_time: Optional[datetime],
+                            end_time: Optional[datetime], cursor: Optional[str], limit: int,
+                            projection: dict) -> tuple[list[dict], Optional[str]]:
+  """
+  Fetch one page of documents in [start_time, end_time), ordered by station
+  code, then newest first.
+
+  All stations are read with one query in the order of the
+  station_issueTime index. The cursor is a keyset on (station, issueTime) of
+  the last returned document, which is unique by that index, so deep pages
+  cost the same as the first one and at most limit + 1 projected documents
+  are read per page.
+
+  Returns:
+      (documents, cursor of the next page or None)
+  """
+  query = {"station": {"$in": list(dict.fromkeys(stations))}}
+  time_range = {}
+  if start_time:
+    time_range["$gte"] = start_time
+  if end_time:
+    time_range["$lt"] = end_time
+  if time_range:
+    query["issueTime"] = time_range
+  if cursor:
+    after_station, before = decode_cursor(cursor)
+    query["$or"] = [
+      {"station": after_station, "issueTime": {"$lt": before}},
+      {"station": {"$gt": after_station}},
+    ]
+  # One extra document tells whether another page follows
+  docs = await collection.find(query, projection).sort([("station", 1), ("issueTime", -1)]).to_list(limit + 1)
+  if len(docs) > limit:
+    last = docs[limit - 1]
+    return docs[:limit], encode_cursor(last["station"], last["issueTime"])
+  return docs, None
+
+def publish_report(collection_name: str, doc: dict):
+  # Rendered and serialized once, no matter how many clients receive it
+  station = doc.get("station")
+  if not event_stream.has_subscribers(station):
+    return
+  product = COLLECTION_PRODUCTS[collection_name]
+  _, build, _ = PRODUCTS[product]
+  event_stream.publish(station, product.lower(), build(doc).model_dump_json())
+
+change_feed.subscribe(publish_report)
+
+async def latest_responses(product: str, stations: list[str], versions: dict = None) -> list:
+  """
+  Latest response per station in request order, served from latest_cache
+  where possible. Only the stations missing in the cache are queried.
+
+  Args:
+      versions: station -> latest issueTime just read from the database,
+          cached responses older than that were not invalidated yet and
+          are fetched again
+  """
+  collection_name, build, _ = PRODUCTS[product]
+  responses = {}
+  missing = []
+  for station in dict.fromkeys(stations):
+    response = latest_cache.get((product, station))
+    if response is not None and versions and station in versions and response.issueTime < versions[station]:
+      latest_cache.invalidate((product, station))
+      response = None
+    if response is None:
+      missing.append(station)
+    else:
+      responses[station] = response
+  timings = request_timings.get()
+  if timings is not None:
+    timings.cache_hits += len(responses)
+    timings.cache_misses += len(missing)
+  if missing:
+    generation = latest_cache.generation
+    docs = await find_latest(db[collection_name], missing)
+    with serialization_time():
+      for station, doc in docs.items():
+        responses[station] = build(doc)
+        latest_cache.put((product, station), responses[station], generation)
+  return [responses[station] for station in stations if station in responses]
+
+async def query_conditions(product: str, request: DTORequest, response: Response) -> list:
+  if request.startTime or request.endTime or request.cursor:
+    _, build, projection = PRODUCTS[product]
+    # limit 0 is rejected, not taken as "no limit"
+    if request.limit is not None and request.limit < 1:
+      raise HTTPException(status_code=400, detail="limit must be positive.")
+    limit = min(request.limit or history_max_page_size, history_max_page_size)
+    docs, next_cursor = await find_history_page(
+      history_collection(product), request.stations, request.startTime, request.endTime,
+      request.cursor, limit, projection
     )
-    if not metar_data:
-      raise HTTPException(status_code=404, detail="METAR data not found for the specified station.")
+    if next_cursor:
+      response.headers["X-Next-Cursor"] = next_cursor
+    with serialization_time():
+      return [build(doc) for doc in docs]
+  return await latest_responses(product, request.stations)
+
+def make_etag(*parts) -> str:
+  raw = json.dumps(parts, default=export_json_default)
+  return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+def cache_headers(etag: str, max_age: int) -> dict:
+  return {"ETag": etag, "Cache-Control": f"max-age={max_age}"}
+
+def check_not_modified(http_request: Request, response: Response, etag: str, max_age: int):
+  """
+  Set the cache headers and answer with 304 if the client has this version.
+  """
+  headers = cache_headers(etag, max_age)
+  if_none_match = http_request.headers.get("If-None-Match")
+  if if_none_match:
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if "*" in tags or etag in tags:
+      raise HTTPException(status_code=304, headers=headers)
+  response.headers.update(headers)
+
+async def latest_issue_times(product: str, stations: list[str]) -> list:
+  """
+  Latest issueTime per station in request order, read from the
+  station_issueTime index only. Stations without data are left out.
+  """
+  collection_name, _, _ = PRODUCTS[product]
+  cursor = db[collection_name].aggregate([
+    {"$match": {"station": {"$in": stations}}},
+    {"$sort": {"station": 1, "issueTime": -1}},
+    {"$group": {"_id": "$station", "issueTime": {"$first": "$issueTime"}}}
+  ])
+  latest = {doc["_id"]: doc["issueTime"] async for doc in cursor}
+  return [(station, latest[station]) for station in dict.fromkeys(stations) if station in latest]
+
+def latest_etag(product: str, versions: list) -> str:
+  return make_etag(product, "latest", versions)
+
+def served_versions(results: list) -> list:
+  return list(dict.fromkeys((result.station, result.issueTime) for result in results))
+
+async def conditional_query(product: str, request: DTORequest, http_request: Request, response: Response) -> list:
+  """
+  query_conditions with an ETag derived from the latest issueTime of the
+  requested stations. A matching If-None-Match costs one index-only lookup.
+  """
+  if request.startTime or request.endTime or request.cursor:
+    versions = await latest_issue_times(product, request.stations)
+    check_not_modified(http_request, response, make_etag(product, request.model_dump(), versions), cache_max_age)
+    return await query_conditions(product, request, response)
+  if "If-None-Match" in http_request.headers:
+    versions = await latest_issue_times(product, request.stations)
+    check_not_modified(http_request, response, latest_etag(product, versions), cache_max_age)
+    results = await latest_responses(product, request.stations, dict(versions))
+  else:
+    results = await latest_responses(product, request.stations)
+  # The ETag always describes the body that is served
+  response.headers.update(cache_headers(latest_etag(product, served_versions(results)), cache_max_age))
+  return results
 
-    metar = MetarConditions.from_dict(metar_data)
-    response = createMetarReponse(metar)
-    return response
+@app.get("/metar/{station}")
+async def get_metar(station: str, http_request: Request, response: Response):
+    responses = await conditional_query("METAR", DTORequest(stations=[station]), http_request, response)
+    if not responses:
+      raise HTTPException(status_code=404, detail="METAR data not found for the specified station.")
+    return responses[0]
 
 @app.post("/metar/query")
-def query_metar(request: DTORequest = Body(...)):
-  results = []
-  for station in request.stations:
-    query = {"station": station}
-    if request.startTime:
-      query["issueTime"] = {"$gte": request.startTime}
-      metar_cursor = db.metar_conditions.find(query, sort=[("issueTime", -1)])
-      metar_list = list(metar_cursor)
-    else:
-      metar_data = db.metar_conditions.find_one(query, sort=[("issueTime", -1)])
-      metar_list = [metar_data] if metar_data else []
-    for metar_data in metar_list:
-      if metar_data:
-        metar = MetarConditions.from_dict(metar_data)
-        response = createMetarReponse(metar)
-        results.append(response)
+async def query_metar(http_request: Request, response: Response, request: DTORequest = Body(...)):
+  results = await conditional_query("METAR", request, http_request, response)
   if not results:
     raise HTTPException(status_code=404, detail="No METAR data found for the specified stations and time.")
   return results
 
 @app.post("/taf/query")
-def query_taf(request: DTORequest = Body(...)):
-  results = []
-  for station in request.stations:
-    query = {"station": station}
-    if request.startTime:
-      query["issueTime"] = {"$gte": request.startTime}
-      taf_cursor = db.taf_conditions.find(query, sort=[("issueTime", -1)])
-      taf_list = list(taf_cursor)
-    else:
-      taf_data = db.taf_conditions.find_one(query, sort=[("issueTime", -1)])
-      taf_list = [taf_data] if taf_data else []
-    for taf_data in taf_list:
-      if taf_data:
-        taf = TAFConditions.from_dict(taf_data)
-        response = create_taf_response(taf)
-        results.append(response)
+async def query_taf(http_request: Request, response: Response, request: DTORequest = Body(...)):
+  results = await conditional_query("TAF", request, http_request, response)
   if not results:
     raise HTTPException(status_code=404, detail="No TAF data found for the specified stations and time.")
   return results
 
+# Every stored field except the Mongo _id is exported
+EXPORT_PROJECTION = {"_id": 0}
+
+def export_json_default(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+async def export_lines(collection, stations: list[str], start_time: Optional[datetime],
+                       end_time: Optional[datetime], batch_size: int, compress: bool):
+  """
+  Stream the matching documents as NDJSON, ordered by station and newest
+  first. One chunk is sent per cursor batch, so memory is bounded by
+  batch_size documents and the first bytes leave after the first batch.
+  """
+  query = {"station": {"$in": list(dict.fromkeys(stations))}}
+  time_range = {}
+  if start_time:
+    time_range["$gte"] = start_time
+  if end_time:
+    time_range["$lt"] = end_time
+  if time_range:
+    query["issueTime"] = time_range
+  cursor = collection.find(query, EXPORT_PROJECTION).sort([("station", 1), ("issueTime", -1)]).batch_size(batch_size)
+  # wbits 31 writes a gzip container
+  compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+  lines = []
+  async for doc in cursor:
+    lines.append(json.dumps(doc, default=export_json_default) + "\n")
+    if len(lines) >= batch_size:
+      chunk = "".join(lines).encode()
+      lines = []
+      # A sync flush lets the client decompress everything sent so far
+      yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else chunk
+  chunk = "".join(lines).encode()
+  yield compressor.compress(chunk) + compressor.flush() if compressor else chunk
+
+def parse_stations(stations: str) -> list[str]:
+  codes = list(dict.fromkeys(code.strip() for code in stations.split(",") if code.strip()))
+  if not codes:
+    raise HTTPException(status_code=400, detail="No stations given.")
+  return codes
+
+def export_response(product: str, stations: str, start_time: Optional[datetime],
+                    end_time: Optional[datetime], batch_size: int, gzip: bool) -> StreamingResponse:
+  codes = parse_stations(stations)
+  headers = {"Content-Disposition": f'attachment; filename="{product.lower()}.ndjson"'}
+  if gzip:
+    headers["Content-Encoding"] = "gzip"
+  return StreamingResponse(
+    export_lines(history_collection(product), codes, start_time, end_time, batch_size, gzip),
+    media_type="application/x-ndjson",
+    headers=headers
+  )
+
+@app.get("/export/metar")
+async def export_metar(stations: str, startTime: Optional[datetime] = None, endTime: Optional[datetime] = None,
+                       batch_size: int = Query(1000, ge=1, le=10000), gzip: bool = False):
+  return export_response("METAR", stations, startTime, endTime, batch_size, gzip)
+
+@app.get("/export/taf")
+async def export_taf(stations: str, startTime: Optional[datetime] = None, endTime: Optional[datetime] = None,
+                     batch_size: int = Query(1000, ge=1, le=10000), gzip: bool = False):
+  return export_response("TAF", stations, startTime, endTime, batch_size, gzip)
+
+INTERVAL_UNITS = {"m": ("minute", 60), "h": ("hour", 3600), "d": ("day", 86400)}
+# Longest bucket of an aggregation, one year
+MAX_BUCKET_SECONDS = 366 * 86400
+
+def parse_interval(interval: str) -> tuple[str, int, int]:
+  """
+  Returns:
+      ($dateTrunc unit, bin size, seconds per bucket)
+  """
+  match = re.fullmatch(r"(\d*)([mhd])", {"hour": "h", "day": "d"}.get(interval, interval))
+  # "00h" and the like are zero as well
+  if not match or int(match.group(1) or 1) < 1:
+    raise HTTPException(status_code=400, detail="interval must be hour, day or a positive number with m, h or d.")
+  unit, seconds = INTERVAL_UNITS[match.group(2)]
+  bin_size = int(match.group(1) or 1)
+  if bin_size * seconds > MAX_BUCKET_SECONDS:
+    raise HTTPException(status_code=400, detail="interval must not be longer than 366 days.")
+  return unit, bin_size, bin_size * seconds
+
+async def aggregate_metar_buckets(stations: list[str], start_time: datetime, end_time: datetime,
+                                  unit: str, bin_size: int) -> list[dict]:
+  """
+  Bucket the METARs of the stations with a single aggregation, the
+  statistics are computed by MongoDB and only the buckets are transferred.
+  """
+  cursor = history_collection("METAR").aggregate([
+    *metar_bucket_stages({"station": {"$in": stations}, "issueTime": {"$gte": start_time, "$lt": end_time}}, unit, bin_size),
+    {"$sort": {"_id.station": 1, "_id.start": 1}},
+  ])
+  return [doc async for doc in cursor]
+
+def columnar_buckets(stations: list[str], buckets: list[dict]) -> list[dict]:
+  """
+  One entry per station with one array per statistic, in request order.
+  """
+  series = {
+    station: {"station": station, "start": [], "count": [], **{
+      name: {"min": [], "max": [], "mean": [], "count": []} for name in AGGREGATE_FIELDS
+    }}
+    for station in stations
+  }
+  for bucket in buckets:
+    entry = series[bucket["_id"]["station"]]
+    entry["start"].append(bucket["_id"]["start"])
+    entry["count"].append(bucket["count"])
+    for name in AGGREGATE_FIELDS:
+      mean = bucket[f"{name}Mean"]
+      entry[name]["min"].append(bucket[f"{name}Min"])
+      entry[name]["max"].append(bucket[f"{name}Max"])
+      entry[name]["mean"].append(round(mean, 2) if mean is not None else None)
+      entry[name]["count"].append(bucket[f"{name}Count"])
+  return [entry for entry in series.values() if entry["start"]]
+
+def naive_utc(value: datetime) -> datetime:
+  """
+  Reports are stored with naive UTC times, clients may send an offset (e.g. "Z").
+  """
+  if value.tzinfo is None:
+    return value
+  return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+@app.post("/metar/aggregate")
+async def aggregate_metar(request: DTOAggregateRequest = Body(...)):
+  """
+  min, max, mean and count of temperature, dew point, wind speed and
+  visibility (meters) per station and time bucket.
+  """
+  unit, bin_size, bucket_seconds = parse_interval(request.interval)
+  start_time = naive_utc(request.startTime)
+  end_time = naive_utc(request.endTime) if request.endTime else naive_utc(datetime.now(timezone.utc))
+  if end_time <= start_time:
+    raise HTTPException(status_code=400, detail="endTime must be after startTime.")
+  if (end_time - start_time).total_seconds() / bucket_seconds > aggregate_max_buckets:
+    raise HTTPException(status_code=400, detail=f"More than {aggregate_max_buckets} buckets per station, use a larger interval.")
+  stations = list(dict.fromkeys(request.stations))
+  buckets = await aggregate_metar_buckets(stations, start_time, end_time, unit, bin_size)
+  if not buckets:
+    raise HTTPException(status_code=404, detail="No METAR data found for the specified stations and time.")
+  # Serialized directly, the generic encoder is slow for thousands of numbers
+  with serialization_time():
+    body = json.dumps(columnar_buckets(stations, buckets), default=export_json_default)
+  return Response(body, media_type="application/json")
+
+@app.get("/stream")
+async def stream(stations: str):
+  """
+  Server-Sent Events with a "metar" or "taf" event per new or updated
+  report of the given comma separated stations.
+  """
+  return StreamingResponse(
+    event_stream.events(parse_stations(stations)),
+    media_type="text/event-stream",
+    # Proxies must pass the events on immediately
+    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+  )
+
+@app.get("/cache/stats")
+async def cache_stats():
+  return {"latest": latest_cache.stats(), "changeFeed": change_feed.stats(), "stream": event_stream.stats()}
+
+@app.get("/metrics")
+async def metrics():
+  """
+  Prometheus metrics of this API process.
+  """
+  body, content_type = metrics_response()
+  return Response(body, headers={"Content-Type": content_type})
+
 @app.post("/station")
-def add_stations(stations: List[DTOStationInfo]):
-  results = []
-  for station_info in stations:
-    station_info_obj = StationInfo(station_info.code, station_info.name)
-    result = db.stations.replace_one(
+async def add_stations(stations: List[DTOStationInfo]):
+  # All upserts are in flight at the same time
+  results = await asyncio.gather(*(
+    db.stations.replace_one(
       {"code": station_info.code},
-      station_info_obj.to_dict(),
+      StationInfo(station_info.code, station_info.name).to_dict(),
       upsert=True
     )
+    for station_info in stations
+  ))
+  for station_info, result in zip(stations, results):
     if not result.acknowledged:
       raise HTTPException(status_code=500, detail=f"Failed to save station info for code {station_info.code}.")
-    results.append({"code": station_info.code, "message": "Station info saved successfully."})
-  return results
+  # New ETag for GET /stations
+  await db.meta.update_one({"_id": "stations"}, {"$inc": {"version": 1}}, upsert=True)
+  return [{"code": station_info.code, "message": "Station info saved successfully."} for station_info in stations]
 
 @app.get("/stations")
-def get_stations():
+async def get_stations(http_request: Request, response: Response):
+  meta = await db.meta.find_one({"_id": "stations"})
+  check_not_modified(http_request, response, f'"stations-{meta["version"] if meta else 0}"', stations_cache_max_age)
   stations_cursor = db.stations.find()
-  stations = [DTOStationInfo(name=station.get("name", ""), code=station.get("code", "")) for station in stations_cursor]
+  stations = [DTOStationInfo(name=station.get("name", ""), code=station.get("code", "")) async for station in stations_cursor]
   return stations
 
 if __name__ == "__main__":
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+import time
+
+class ResponseCache:
+  """
+  Bounded LRU cache with a time to live for ready-to-serve API responses.
+  Only used from the event loop, so it needs no locking.
+
+  Args:
+      size: maximum number of entries, 0 disables the cache
+      ttl: seconds an entry is served before it is fetched again
+  """
+  def __init__(self, size: int, ttl: float):
+    self.size = size
+    self.ttl = ttl
+    self.entries = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.invalidations = 0
+    # Bumped on every invalidation, see put
+    self.generation = 0
+
+  def get(self, key):
+    entry = self.entries.get(key)
+    if entry is None or entry[0] < time.monotonic():
+      if entry is not None:
+        del self.entries[key]
+      self.misses += 1
+      return None
+    self.entries.move_to_end(key)
+    self.hits += 1
+    return entry[1]
+
+  def put(self, key, value, generation: int = None):
+    """
+    Store a value. Pass the generation read before fetching the value from
+    the database to drop it if an invalidation happened in the meantime.
+    """
+    if self.size <= 0 or (generation is not None and generation != self.generation):
+      return
+    self.entries[key] = (time.monotonic() + self.ttl, value)
+    self.entries.move_to_end(key)
+    while len(self.entries) > self.size:
+      self.entries.popitem(last=False)
+      self.evictions += 1
+
+  def invalidate(self, key):
+    self.generation += 1
+    if self.entries.pop(key, None) is not None:
+      self.invalidations += 1
+
+  def stats(self) -> dict:
+    lookups = self.hits + self.misses
+    return {
+      "size": len(self.entries),
+      "maxSize": self.size,
+      "ttl": self.ttl,
+      "hits": self.hits,
+      "misses": self.misses,
+      "hitRatio": self.hits / lookups if lookups else 0.0,
+      "evictions": self.evictions,
+      "invalidations": self.invalidations
+    }
@@ -0,0 +1,177 @@
+from pymongo import ASCENDING
+from datetime import datetime, timedelta
+from Storage import METAR_TIMESERIES, metar_bucket_stages
+from Scheduler import DAY, HOUR
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+TTL_INDEX = "issueTime_ttl"
+METAR_DAILY = "metar_daily"
+# Progress of the rollup and the compaction, stored in the meta collection
+STATE_ID = "retention"
+# Longest TAF validity period, all TAFs of one period are issued within it
+MAX_TAF_VALIDITY = timedelta(hours=30)
+
+class RetentionPolicy:
+  """
+  Retention settings, read from the environment by from_env.
+
+  Args:
+      metar_days: days METARs are kept before MongoDB expires them, 0 keeps them forever
+      taf_days: days TAFs are kept, 0 keeps them forever
+      rollup: aggregate every finished day into metar_daily before it expires
+      taf_compact_after_hours: TAFs younger than this are never compacted
+      metar_latest_hours: with time-series storage metar_conditions only
+          serves the latest reports and keeps them this many hours
+  """
+  def __init__(self, metar_days: int = 0, taf_days: int = 0, rollup: bool = True,
+               taf_compact_after_hours: int = 24, metar_latest_hours: int = 48):
+    self.metar_days = metar_days
+    self.taf_days = taf_days
+    self.rollup = rollup
+    self.metar_latest_hours = metar_latest_hours
+    self.taf_compact_after_hours = taf_compact_after_hours
+
+  @staticmethod
+  def from_env():
+    return RetentionPolicy(
+      metar_days=int(os.environ.get("RETENTION_METAR_DAYS", "0")),
+      taf_days=int(os.environ.get("RETENTION_TAF_DAYS", "0")),
+      rollup=os.environ.get("RETENTION_ROLLUP", "true").lower() in ("1", "true", "yes"),
+      taf_compact_after_hours=int(os.environ.get("RETENTION_TAF_COMPACT_AFTER_HOURS", "24")),
+      metar_latest_hours=int(os.environ.get("RETENTION_METAR_LATEST_HOURS", "48"))
+    )
+
+def apply_ttl(db, collection_name: str, seconds: int) -> str:
+  """
+  Create, change or drop the TTL index on issueTime of a condition
+  collection, 0 seconds keeps the documents forever. Time-series
+  collections expire through a collection option instead of an index.
+
+  Returns:
+      description of what was done
+  """
+  expiry = f"{collection_name}: expire after {seconds / HOUR:g} hours" if seconds else f"{collection_name}: no expiry"
+  if collection_name == METAR_TIMESERIES:
+    if collection_name not in db.list_collection_names():
+      return f"{collection_name}: does not exist"
+    db.command("collMod", collection_name, expireAfterSeconds=seconds or "off")
+    return expiry
+  existing = db[collection_name].index_information().get(TTL_INDEX)
+  if not seconds:
+    if existing:
+      db[collection_name].drop_index(TTL_INDEX)
+    return expiry
+  if existing is None:
+    db[collection_name].create_index([("issueTime", ASCENDING)], name=TTL_INDEX, expireAfterSeconds=seconds)
+  elif existing.get("expireAfterSeconds") != seconds:
+    db.command("collMod", collection_name, index={"name": TTL_INDEX, "expireAfterSeconds": seconds})
+  return expiry
+
+def apply_metar_ttls(db, policy: RetentionPolicy, metar_history: str) -> list[str]:
+  """
+  TTL of the METAR collections. With time-series storage the history lives
+  in metar_history and metar_conditions only keeps the latest reports.
+
+  Returns:
+      descriptions of what was done
+  """
+  if metar_history == "metar_conditions":
+    return [apply_ttl(db, "metar_conditions", policy.metar_days * DAY)]
+  return [
+    apply_ttl(db, "metar_conditions", policy.metar_latest_hours * HOUR),
+    apply_ttl(db, metar_history, policy.metar_days * DAY),
+  ]
+
+def load_state(db) -> dict:
+  return db.meta.find_one({"_id": STATE_ID}) or {}
+
+def save_state(db, **fields):
+  db.meta.update_one({"_id": STATE_ID}, {"$set": fields}, upsert=True)
+
+def rollup_metar_days(db, source: str, until: datetime) -> int:
+  """
+  Aggregate all finished days since the last rollup into metar_daily with
+  one document per station and day. Every day is rolled up once, before
+  the TTL index starts to expire its reports.
+
+  Returns:
+      number of rolled up days
+  """
+  state = load_state(db)
+  start = state.get("rolledUpUntil")
+  if start is None:
+    oldest = db[source].find_one({}, {"issueTime": 1}, sort=[("issueTime", ASCENDING)])
+    if oldest is None:
+      return 0
+    start = oldest["issueTime"].replace(hour=0, minute=0, second=0, microsecond=0)
+  if start >= until:
+    return 0
+  db[source].aggregate([
+    *metar_bucket_stages({"issueTime": {"$gte": start, "$lt": until}}, "day", 1),
+    {"$addFields": {"station": "$_id.station", "day": "$_id.start"}},
+    {"$merge": {"into": METAR_DAILY, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+  ], allowDiskUse=True)
+  save_state(db, rolledUpUntil=until)
+  return (until - start).days
+
+def compact_tafs(db, until: datetime) -> int:
+  """
+  Delete superseded TAFs: of all TAFs of a station with the same end of
+  validity (a routine TAF and its amendments and corrections, which replace
+  the rest of its period) only the newest one is kept. Routine TAFs of
+  consecutive cycles end at different times and are all kept. Only TAFs
+  issued before until are touched, TAFs stored without validityEnd (before
+  it was parsed, see replay) are never deleted.
+
+  Returns:
+      number of deleted TAFs
+  """
+  start = load_state(db).get("compactedUntil")
+  # Earlier TAFs of a period may have been kept by the last run, include them again
+  match = {"issueTime": {"$lt": until}, "validityEnd": {"$ne": None}}
+  if start is not None:
+    match["issueTime"]["$gte"] = start - MAX_TAF_VALIDITY
+  groups = db.taf_conditions.aggregate([
+    {"$match": match},
+    {"$project": {"station": 1, "issueTime": 1, "validityEnd": 1}},
+    {"$sort": {"station": 1, "issueTime": -1}},
+    {"$group": {
+      "_id": {"station": "$station", "validityEnd": "$validityEnd"},
+      "ids": {"$push": "$_id"}
+    }},
+    {"$match": {"ids.1": {"$exists": True}}},
+  ], allowDiskUse=True)
+  deleted = 0
+  batch = []
+  for group in groups:
+    # Newest first, all but the first one are superseded
+    batch.extend(group["ids"][1:])
+    if len(batch) >= 1000:
+      deleted += db.taf_conditions.delete_many({"_id": {"$in": batch}}).deleted_count
+      batch = []
+  if batch:
+    deleted += db.taf_conditions.delete_many({"_id": {"$in": batch}}).deleted_count
+  save_state(db, compactedUntil=until)
+  return deleted
+
+def run_retention(db, policy: RetentionPolicy, metar_history: str = "metar_conditions", now: datetime = None):
+  """
+  One retention run: roll up, apply the TTL settings and compact the TAFs.
+  Meant to run daily, e.g. as Kubernetes CronJob.
+  """
+  now = now or datetime.now()
+  today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+  if policy.rollup:
+    if 0 < policy.metar_days < 2:
+      log.warning("METARs expire before their day is finished, keep them at least 2 days to roll them up")
+    # Rolled up before the TTL settings change, so no day expires unseen
+    days = rollup_metar_days(db, metar_history, today)
+    log.info("Rolled up METARs", extra={"days": days, "collection": METAR_DAILY})
+  for result in apply_metar_ttls(db, policy, metar_history):
+    log.info("TTL applied", extra={"result": result})
+  log.info("TTL applied", extra={"result": apply_ttl(db, "taf_conditions", policy.taf_days * DAY)})
+  deleted = compact_tafs(db, now - timedelta(hours=policy.taf_compact_after_hours))
+  log.info("Compacted TAFs", extra={"deleted": deleted})
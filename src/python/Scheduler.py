@@ -0,0 +1,134 @@
+import heapq
+import math
+import random
+import threading
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+class ProductCadence:
+  """
+  Refresh cadence of one product.
+
+  Args:
+      interval: seconds between two refreshes of a station
+      issue_times: expected issue times in seconds after the period start (UTC)
+      period: length of the issue time period, HOUR for METAR, DAY for TAF
+      publish_delay: seconds after the issue time until the report is available upstream
+  """
+  def __init__(self, interval: float, issue_times: list[float] = None, period: float = HOUR,
+               publish_delay: float = 0):
+    self.interval = interval
+    self.issue_times = sorted(issue_times or [])
+    self.period = period
+    self.publish_delay = publish_delay
+
+  def next_issue(self, now: float) -> float:
+    """
+    Return the next expected publication time after now, or None if the
+    product has no issue times.
+    """
+    if not self.issue_times:
+      return None
+    period_start = now - now % self.period
+    candidates = []
+    for offset in self.issue_times:
+      candidate = period_start + offset + self.publish_delay
+      if candidate <= now:
+        candidate += self.period
+      candidates.append(candidate)
+    return min(candidates)
+
+  def next_due(self, now: float) -> float:
+    """
+    Regular refresh after the interval, moved forward to shortly after the
+    next expected issue time if that comes earlier.
+    """
+    due = now + self.interval
+    issue = self.next_issue(now)
+    if issue is not None and issue < due:
+      due = issue
+    return due
+
+# Routine METARs are issued at HH:20/HH:50, TAFs about one hour before 00, 06, 12 and 18 UTC
+METAR_ISSUE_TIMES = [20 * 60, 50 * 60]
+TAF_ISSUE_TIMES = [5 * HOUR, 11 * HOUR, 17 * HOUR, 23 * HOUR]
+
+class Scheduler:
+  """
+  Thread safe priority queue of (due time, product, station) refreshes.
+  Due times are rounded up to fixed ticks, so the refreshes of many
+  stations come due together and share their upstream requests instead of
+  trickling in one cycle at a time.
+
+  Removed stations stay in the heap and are dropped lazily when they come up,
+  entries carry the generation of the station so a re-added station does not
+  inherit its old entries.
+
+  Args:
+      cadences: product -> cadence
+      tick: seconds between two scheduling ticks
+  """
+  def __init__(self, cadences: dict[str, ProductCadence], tick: float = 60):
+    self.cadences = cadences
+    self.tick = max(1, tick)
+    self.heap = []
+    self.stations = {}
+    self.generation = 0
+    self.lock = threading.Lock()
+
+  def align(self, due: float) -> float:
+    """
+    Round a due time up to the next tick.
+    """
+    return math.ceil(due / self.tick) * self.tick
+
+  def add(self, station: str, now: float):
+    """
+    Schedule all products of a new station right away.
+    """
+    with self.lock:
+      if station in self.stations:
+        return
+      self.generation += 1
+      self.stations[station] = self.generation
+      for product in self.cadences:
+        heapq.heappush(self.heap, (now, product, station, self.generation))
+
+  def remove(self, station: str):
+    with self.lock:
+      self.stations.pop(station, None)
+
+  def pop_due(self, now: float) -> dict[str, list[str]]:
+    """
+    Pop all refreshes due at now and schedule their next run.
+
+    Returns:
+        dict of product -> sorted station codes to refresh, sorted so the
+        same stations end up in the same batch URLs
+    """
+    due = {}
+    with self.lock:
+      while self.heap and self.heap[0][0] <= now:
+        _, product, station, generation = heapq.heappop(self.heap)
+        if self.stations.get(station) != generation:
+          continue
+        due.setdefault(product, []).append(station)
+        heapq.heappush(self.heap, (self.align(self.cadences[product].next_due(now)), product, station, generation))
+    for codes in due.values():
+      codes.sort()
+    return due
+
+  def next_due(self) -> float:
+    with self.lock:
+      return self.heap[0][0] if self.heap else None
+
+def batch_delays(count: int, spread: float) -> list[float]:
+  """
+  Random start delays for the batches of one tick, so the upstream
+  requests of a tick are spread over the first spread seconds.
+
+  Returns:
+      sorted delays in seconds
+  """
+  return sorted(random.uniform(0, spread) for _ in range(count))
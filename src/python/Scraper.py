@@ -1,6 +1,25 @@
 from MetarTaf import *
+from Upstream import UpstreamClient
+from Scheduler import Scheduler, ProductCadence, HOUR, DAY, METAR_ISSUE_TIMES, TAF_ISSUE_TIMES, batch_delays
+from StationRegistry import StationRegistry
+from Indexes import ensure_indexes
+from Archive import ReportArchive
+from Storage import METAR_TIMESERIES, TimeSeriesWriter, ensure_timeseries, history_collection_name, storage_mode
+from Describe import RENDERER_VERSION, render_metar, render_taf
+from Metrics import WRITE_SECONDS, configure_logging, push_metrics, serve_metrics
+from prometheus_client import Counter, Gauge, Histogram
+from concurrent.futures import ThreadPoolExecutor, wait
+import argparse
+import functools
+import logging
+import signal
+import sys
+import time
 import requests
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+import hashlib
+import threading
 import os
 
 # Mongo setup
@@ -16,6 +35,56 @@ client = MongoClient(mongo_uri)
 db = client["aviation"]
 metar_collection = db["metar_conditions"]
 taf_collection = db["taf_conditions"]
+state_collection = db["scrape_state"]
+
+# Upstream setup
+api_base_url = os.environ.get("AVIATIONWEATHER_URL", "https://aviationweather.gov/api/data").rstrip("/")
+# Stations per request, aviationweather.gov accepts comma separated ids
+batch_size = int(os.environ.get("SCRAPER_BATCH_SIZE", "50"))
+# Parallel upstream requests, each batch issues one METAR and one TAF request
+concurrency = int(os.environ.get("SCRAPER_CONCURRENCY", "4"))
+
+upstream = UpstreamClient(
+  pool_size=concurrency,
+  rate=float(os.environ.get("SCRAPER_RATE_LIMIT", "5")),
+  burst=int(os.environ.get("SCRAPER_RATE_BURST", "5")),
+  retries=int(os.environ.get("SCRAPER_RETRIES", "3")),
+  backoff=float(os.environ.get("SCRAPER_BACKOFF", "0.5"))
+)
+
+# Upserts per bulk_write round-trip
+write_batch_size = int(os.environ.get("SCRAPER_WRITE_BATCH_SIZE", "500"))
+
+# Daemon mode cadences in seconds
+metar_interval = float(os.environ.get("SCRAPER_METAR_INTERVAL", "600"))
+taf_interval = float(os.environ.get("SCRAPER_TAF_INTERVAL", "3600"))
+publish_delay = float(os.environ.get("SCRAPER_PUBLISH_DELAY", "300"))
+tick = float(os.environ.get("SCRAPER_TICK", "60"))
+jitter = float(os.environ.get("SCRAPER_JITTER", "0.1"))
+station_refresh = float(os.environ.get("SCRAPER_STATION_REFRESH", "300"))
+
+# Raw reports are archived for replays when a directory is set
+archive_dir = os.environ.get("SCRAPER_ARCHIVE_DIR")
+report_archive = ReportArchive(archive_dir) if archive_dir else None
+
+# Metrics are served on this port in daemon mode, one-shot runs push them to the Pushgateway if set
+metrics_port = int(os.environ.get("SCRAPER_METRICS_PORT", "9100"))
+pushgateway_url = os.environ.get("PUSHGATEWAY_URL")
+
+REPORT_PREFIXES = {"METAR", "SPECI", "TAF", "AMD", "COR"}
+
+# Validators of URLs not requested for this long are forgotten
+VALIDATOR_MAX_AGE = DAY
+
+log = logging.getLogger("Scraper")
+
+FETCH_SECONDS = Histogram("scraper_fetch_seconds", "Upstream request per batch of stations, including retries", ["product"])
+PARSE_SECONDS = Histogram("scraper_parse_seconds", "Parse time per report", ["product"],
+                          buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1))
+REPORTS = Counter("scraper_reports", "Station reports by outcome", ["product", "result"])
+FETCH_ERRORS = Counter("scraper_fetch_errors", "Failed upstream requests per batch of stations", ["product"])
+CYCLE_SECONDS = Histogram("scraper_cycle_seconds", "Duration of a scrape cycle", buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800))
+LAST_CYCLE = Gauge("scraper_last_cycle_timestamp_seconds", "End of the last finished scrape cycle")
 
 def GetAirportCodes():
   # TODO: Load airport codes from a file or database
@@ -25,52 +94,551 @@ def GetAirportCodes():
   #]
   return [doc["code"] for doc in db["stations"].find({}, {"code": 1, "_id": 0})]
 
-def save_metar_to_db(metar_obj: MetarConditions):
+class ConditionWriter:
+  """
+  Buffers upserts for one conditions collection and writes them with
+  unordered bulk_write batches instead of one replace_one per report.
+  Safe to share between the scraper threads.
+
+  on_written callbacks are called once the upsert of their report
+  succeeded, a failed or lost write never calls them.
+  """
+  def __init__(self, collection, batch_size: int):
+    self.collection = collection
+    self.batch_size = max(1, batch_size)
+    self.pending = []
+    self.lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    self.matched = 0
+    self.upserted = 0
+    self.modified = 0
+    self.errors = 0
+
+  def add(self, conditions, on_written=None):
+    """
+    Queue an upsert keyed on station and issue time, flushing once the
+    batch is full.
+    """
+    operation = ReplaceOne(
+      {"station": conditions.station, "issueTime": conditions.issueTime},
+      conditions.to_dict(),
+      upsert=True
+    )
+    with self.lock:
+      self.pending.append((operation, on_written))
+      if len(self.pending) < self.batch_size:
+        return
+      batch, self.pending = self.pending, []
+    self.write(batch)
+
+  def flush(self):
+    with self.lock:
+      batch, self.pending = self.pending, []
+    if batch:
+      self.write(batch)
+
+  def write(self, batch: list[tuple]):
+    try:
+      with WRITE_SECONDS.labels(self.collection.name).time():
+        result = self.collection.bulk_write([operation for operation, _ in batch], ordered=False)
+      counts = result.bulk_api_result
+    except BulkWriteError as e:
+      counts = e.details
+      log.warning("Bulk write failed for some documents",
+                  extra={"collection": self.collection.name, "errors": len(counts["writeErrors"])})
+    except PyMongoError as e:
+      # The whole batch is lost, its reports are written again by the next cycle
+      log.error("Bulk write failed", extra={"collection": self.collection.name, "documents": len(batch), "error": str(e)})
+      with self.lock:
+        self.errors += len(batch)
+      return
+    failed = {error["index"] for error in counts.get("writeErrors", [])}
+    with self.lock:
+      self.matched += counts["nMatched"]
+      self.upserted += counts["nUpserted"]
+      self.modified += counts["nModified"]
+      self.errors += len(failed)
+    for index, (_, on_written) in enumerate(batch):
+      if on_written and index not in failed:
+        on_written()
+
+  def summary(self) -> str:
+    return (f"{self.collection.name}: matched {self.matched}, upserted {self.upserted}, "
+            f"modified {self.modified}, errors {self.errors}")
+
+metar_writer = ConditionWriter(metar_collection, write_batch_size)
+taf_writer = ConditionWriter(taf_collection, write_batch_size)
+# METAR history is written to the time-series collection as well, metar_conditions keeps serving the latest reports
+metar_storage = storage_mode()
+metar_series_writer = TimeSeriesWriter(db[METAR_TIMESERIES], write_batch_size) if metar_storage == "timeseries" else None
+writers = [writer for writer in (metar_writer, taf_writer, metar_series_writer) if writer]
+
+def after_all(count: int, callback):
+  """
+  Callback to hand to count writers, calls callback once all of them called it.
+  """
+  if callback is None or count == 1:
+    return callback
+  remaining = [count]
+  lock = threading.Lock()
+  def written():
+    with lock:
+      remaining[0] -= 1
+      done = remaining[0] == 0
+    if done:
+      callback()
+  return written
+
+def save_metar_to_db(metar_obj: MetarConditions, on_written=None):
     if metar_obj:
-        metar_collection.replace_one(
-            {"station": metar_obj.station, "issueTime": metar_obj.issueTime},
-            metar_obj.to_dict(),
-            upsert=True
-        )
+        if metar_obj.descriptionVersion != RENDERER_VERSION:
+            render_metar(metar_obj)
+        on_written = after_all(2 if metar_series_writer else 1, on_written)
+        metar_writer.add(metar_obj, on_written)
+        if metar_series_writer:
+            metar_series_writer.add(metar_obj, on_written)
 
-def save_taf_to_db(taf_obj: TAFConditions):
+def save_taf_to_db(taf_obj: TAFConditions, on_written=None):
     if taf_obj:
-        taf_collection.replace_one(
-            {"station": taf_obj.station, "issueTime": taf_obj.issueTime},
-            taf_obj.to_dict(),
-            upsert=True
-        )
-
-def GetMetarData(id: str) -> str:
-  url = f"https://aviationweather.gov/api/data/metar?ids={id}&format=raw&taf=false&hours=1"
-  response = requests.get(url)
-  response.raise_for_status()
-  return response.text
-
-def GetTafData(id: str) -> str:
-  url = f"https://aviationweather.gov/api/data/taf?ids={id}&format=raw&metar=false&time=valid"
-  response = requests.get(url)
-  response.raise_for_status()
-  text = response.text.replace('\n', '')
-  if not text.startswith('TAF'):
-    text = 'TAF ' + text
-  return text
+        if taf_obj.descriptionVersion != RENDERER_VERSION:
+            render_taf(taf_obj)
+        taf_writer.add(taf_obj, on_written)
 
-def main():
-  airport_codes = GetAirportCodes()
-  print(f"Found {len(airport_codes)} airport codes to process.")
-  for airport_code in airport_codes:
+def chunk_codes(codes: list[str], size: int) -> list[list[str]]:
+  size = max(1, size)
+  return [codes[i:i + size] for i in range(0, len(codes), size)]
+
+def report_station(report: str) -> str:
+  """
+  Return the station code of a raw METAR/TAF report, skipping the
+  optional report type and modifier prefixes.
+  """
+  for token in report.split():
+    if token not in REPORT_PREFIXES:
+      return token
+  return None
+
+def split_metar_reports(text: str) -> dict[str, str]:
+  """
+  Split a multi-station raw METAR response into one report per station.
+
+  The API returns one report per line, newest first, so only the first
+  report of each station is kept.
+
+  Returns:
+      dict of station code -> raw METAR string
+  """
+  reports = {}
+  for line in text.splitlines():
+    line = line.strip()
+    if not line:
+      continue
+    station = report_station(line)
+    if station and station not in reports:
+      reports[station] = line
+  return reports
+
+def split_taf_reports(text: str) -> dict[str, str]:
+  """
+  Split a multi-station raw TAF response into one report per station.
+
+  A report starts on an unindented line, its change groups follow on
+  indented continuation lines.
+
+  Returns:
+      dict of station code -> raw TAF string (prefixed with "TAF")
+  """
+  blocks = []
+  for line in text.splitlines():
+    if not line.strip():
+      continue
+    if not line[0].isspace() or not blocks:
+      blocks.append([])
+    blocks[-1].append(line)
+
+  reports = {}
+  for block in blocks:
+    report = "".join(block)
+    if not report.startswith('TAF'):
+      report = 'TAF ' + report
+    station = report_station(report)
+    if station and station not in reports:
+      reports[station] = report
+  return reports
+
+class ScrapeState:
+  """
+  Remembers a content hash of the last raw report per station and product
+  plus the ETag/Last-Modified validators per upstream URL, so unchanged
+  reports are neither parsed nor written again. Stored in the scrape_state
+  collection, loaded once per run and saved in one bulk_write. Validators
+  of URLs that are no longer requested expire, see expire_validators.
+  """
+  def __init__(self, collection):
+    self.collection = collection
+    self.entries = {}
+    self.dirty = set()
+    self.lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    self.skipped = 0
+    self.parsed = 0
+    self.written = 0
+
+  def load(self):
+    with self.lock:
+      self.entries = {doc["_id"]: doc for doc in self.collection.find()}
+      self.dirty = set()
+
+  def update(self, key: str, **fields):
+    with self.lock:
+      self.entries.setdefault(key, {"_id": key}).update(fields)
+      self.dirty.add(key)
+
+  def count(self, skipped=0, parsed=0, written=0):
+    with self.lock:
+      self.skipped += skipped
+      self.parsed += parsed
+      self.written += written
+
+  def is_unchanged(self, product: str, station: str, raw: str) -> bool:
+    entry = self.entries.get(f"{product}:{station}")
+    return entry is not None and entry.get("hash") == report_hash(raw)
+
+  def remember_report(self, product: str, station: str, raw: str):
+    self.update(f"{product}:{station}", hash=report_hash(raw))
+
+  def conditional_headers(self, url: str) -> dict:
+    entry = self.entries.get(f"url:{url}", {})
+    headers = {}
+    if entry.get("etag"):
+      headers["If-None-Match"] = entry["etag"]
+    if entry.get("lastModified"):
+      headers["If-Modified-Since"] = entry["lastModified"]
+    return headers
+
+  def remember_response(self, url: str, response):
+    key = f"url:{url}"
+    if response.status_code == 304:
+      if key in self.entries:
+        self.update(key, seen=time.time())
+      return
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if etag or last_modified:
+      self.update(key, etag=etag, lastModified=last_modified, seen=time.time())
+
+  def expire_validators(self, max_age: float) -> int:
+    """
+    Forget the validators of URLs without a response for max_age seconds.
+    Batch URLs list the stations of the batch, in daemon mode the batches
+    change with the due stations and old URLs would pile up otherwise.
+
+    Returns:
+        number of expired URLs
+    """
+    cutoff = time.time() - max_age
+    with self.lock:
+      expired = [key for key, entry in self.entries.items() if key.startswith("url:") and entry.get("seen", 0) < cutoff]
+      for key in expired:
+        del self.entries[key]
+        self.dirty.discard(key)
+    if expired:
+      self.collection.delete_many({"_id": {"$in": expired}})
+    return len(expired)
+
+  def save(self):
+    with self.lock:
+      operations = [
+        UpdateOne({"_id": key}, {"$set": self.entries[key]}, upsert=True)
+        for key in self.dirty
+      ]
+      self.dirty = set()
+    if operations:
+      self.collection.bulk_write(operations, ordered=False)
+
+  def summary(self) -> str:
+    return f"Station reports skipped {self.skipped}, parsed {self.parsed}, written {self.written}"
+
+scrape_state = ScrapeState(state_collection)
+
+def report_hash(raw: str) -> str:
+  return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def fetch_conditional(url: str) -> str:
+  """
+  GET the url with the validators of the previous response.
+
+  Returns:
+      response text, or None if the upstream answered 304 Not Modified
+  """
+  response = upstream.get(url, headers=scrape_state.conditional_headers(url))
+  scrape_state.remember_response(url, response)
+  return None if response.status_code == 304 else response.text
+
+def GetMetarDataBatch(ids: list[str]) -> dict[str, str]:
+  url = f"{api_base_url}/metar?ids={','.join(ids)}&format=raw&taf=false&hours=1"
+  text = fetch_conditional(url)
+  return None if text is None else split_metar_reports(text)
+
+def GetTafDataBatch(ids: list[str]) -> dict[str, str]:
+  url = f"{api_base_url}/taf?ids={','.join(ids)}&format=raw&metar=false&time=valid"
+  text = fetch_conditional(url)
+  return None if text is None else split_taf_reports(text)
+
+# Fetch, parse and save functions per product
+PRODUCTS = {
+  "METAR": (GetMetarDataBatch, parse_metar_conditions, save_metar_to_db),
+  "TAF": (GetTafDataBatch, parse_taf_conditions, save_taf_to_db),
+}
+
+def process_batch(product: str, codes: list[str]):
+  fetch, parse, save = PRODUCTS[product]
+  try:
+    with FETCH_SECONDS.labels(product).time():
+      reports = fetch(codes)
+  except requests.RequestException as e:
+    FETCH_ERRORS.labels(product).inc()
+    log.warning("Fetching failed", extra={"product": product, "stations": codes, "error": str(e)})
+    return
+  if reports is None:
+    scrape_state.count(skipped=len(codes))
+    REPORTS.labels(product, "not_modified").inc(len(codes))
+    log.debug("Not modified", extra={"product": product, "stations": codes})
+    return
+  for airport_code in codes:
+    raw = reports.get(airport_code)
+    if raw is None:
+      REPORTS.labels(product, "missing").inc()
+      log.info("No report returned", extra={"product": product, "station": airport_code})
+      continue
+    if scrape_state.is_unchanged(product, airport_code, raw):
+      scrape_state.count(skipped=1)
+      REPORTS.labels(product, "unchanged").inc()
+      continue
+    # One broken report or write must not cost the other stations of the batch
     try:
-      metarRaw = GetMetarData(airport_code)
-      metarParsed = parse_metar_conditions(metarRaw)
-      save_metar_to_db(metarParsed)
-      print(f"Processed METAR {airport_code}")
-      
-      tafRaw = GetTafData(airport_code)
-      tafParsed = parse_taf_conditions(tafRaw)
-      save_taf_to_db(tafParsed)
-      print(f"Processed TAF   {airport_code}")
-    except requests.RequestException as e:
-      print(f"Error fetching data for {airport_code}: {e}") 
+      process_report(product, airport_code, raw, parse, save)
+    except Exception:
+      REPORTS.labels(product, "error").inc()
+      log.exception("Processing failed", extra={"product": product, "station": airport_code, "raw": raw})
+
+def process_report(product: str, airport_code: str, raw: str, parse, save):
+  """
+  Archive, parse and save one changed report.
+  """
+  if report_archive:
+    report_archive.add(product, airport_code, raw, api_base_url)
+  with PARSE_SECONDS.labels(product).time():
+    parsed = parse(raw)
+  if parsed:
+    # The hash is only remembered once the report is stored, a failed write is retried next cycle
+    save(parsed, functools.partial(scrape_state.remember_report, product, airport_code, raw))
+  else:
+    scrape_state.remember_report(product, airport_code, raw)
+  scrape_state.count(parsed=1, written=1 if parsed else 0)
+  REPORTS.labels(product, "parsed" if parsed else "failed").inc()
+  log.debug("Processed", extra={"product": product, "station": airport_code})
+
+def run_batches(batches: list[list[str]]):
+  """
+  Process all batches on a bounded thread pool. Each batch is split into an
+  independent METAR and TAF task, so one failing request only affects the
+  stations of that batch and product.
+  """
+  with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+    futures = []
+    for codes in batches:
+      for product in PRODUCTS:
+        futures.append(executor.submit(process_batch, product, codes))
+    for future in futures:
+      try:
+        future.result()
+      except Exception:
+        log.exception("Unexpected error while scraping")
+
+def finish_cycle():
+  for writer in writers:
+    writer.flush()
+  if report_archive:
+    report_archive.flush()
+  scrape_state.expire_validators(VALIDATOR_MAX_AGE)
+  scrape_state.save()
+  log.info(scrape_state.summary())
+  for writer in writers:
+    log.info(writer.summary())
+    writer.reset()
+  scrape_state.reset()
+  LAST_CYCLE.set_to_current_time()
+
+def run_daemon():
+  """
+  Keep one process, Mongo pool and HTTP pool alive and refresh every station
+  and product on its own cadence until SIGTERM/SIGINT. The refreshes due at
+  a scheduling tick form one cycle, its batches start with a random delay
+  of up to SCRAPER_JITTER of the tick.
+  """
+  stop = threading.Event()
+  wake = threading.Event()
+  def request_stop(signum, frame):
+    log.info("Shutting down after the current cycle", extra={"signal": signum})
+    stop.set()
+    wake.set()
+  signal.signal(signal.SIGTERM, request_stop)
+  signal.signal(signal.SIGINT, request_stop)
+
+  scheduler = Scheduler({
+    "METAR": ProductCadence(metar_interval, METAR_ISSUE_TIMES, HOUR, publish_delay),
+    "TAF": ProductCadence(taf_interval, TAF_ISSUE_TIMES, DAY, publish_delay),
+  }, tick)
+  scrape_state.reset()
+  scrape_state.load()
+
+  # New stations are scheduled right away and wake up the loop
+  def station_added(code: str):
+    scheduler.add(code, time.time())
+    wake.set()
+  registry = StationRegistry(db["stations"], station_refresh)
+  registry.subscribe(station_added, scheduler.remove)
+  registry.start()
+  if metrics_port:
+    serve_metrics(metrics_port)
+  log.info("Daemon started", extra={"stations": len(registry.codes()), "stationSource": registry.mode})
+
+  with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+    while not stop.is_set():
+      wake.clear()
+      now = time.time()
+      batches = [
+        (product, chunk)
+        for product, codes in scheduler.pop_due(now).items()
+        for chunk in chunk_codes(codes, batch_size)
+      ]
+      futures = []
+      for delay, (product, chunk) in zip(batch_delays(len(batches), tick * jitter), batches):
+        stop.wait(max(0.0, now + delay - time.time()))
+        futures.append(executor.submit(process_batch, product, chunk))
+      if futures:
+        for future in wait(futures).done:
+          if future.exception():
+            log.error("Unexpected error while scraping", exc_info=future.exception())
+        finish_cycle()
+        CYCLE_SECONDS.observe(time.time() - now)
+
+      next_due = scheduler.next_due()
+      wake.wait(max(0.0, next_due - time.time()) if next_due else None)
+
+  registry.stop()
+  finish_cycle()
+  upstream.close()
+  client.close()
+  log.info("Daemon stopped")
+
+def parse_into_db(product: str, reports, workers: int = None, chunk_size: int = 1000) -> tuple[int, int]:
+  """
+  Parse (raw, reference) tuples on all cores and bulk-upsert the results.
+  Time-series history is replaced as well, so a replay corrects it.
+  """
+  from Backfill import run_backfill
+  _, _, save = PRODUCTS[product]
+  product_writers = [metar_writer, metar_series_writer] if product == "METAR" else [taf_writer]
+  product_writers = [writer for writer in product_writers if writer]
+  for writer in product_writers:
+    writer.reset()
+  if metar_series_writer:
+    metar_series_writer.replace = True
+  start = time.time()
+  try:
+    read, parsed = run_backfill(reports, product, save, workers, chunk_size)
+    for writer in product_writers:
+      writer.flush()
+  finally:
+    if metar_series_writer:
+      metar_series_writer.replace = False
+  elapsed = time.time() - start
+  log.info("Parsed reports", extra={
+    "product": product, "read": read, "parsed": parsed,
+    "seconds": round(elapsed, 1), "reportsPerSecond": round(read / max(elapsed, 1e-9))
+  })
+  for writer in product_writers:
+    log.info(writer.summary())
+  return read, parsed
+
+def backfill(product: str, path: str, workers: int = None, chunk_size: int = 1000, reference: datetime = None):
+  """
+  Parse a file of raw reports on all cores and bulk-upsert the results.
+  """
+  from Backfill import read_reports
+  source = sys.stdin if path == "-" else open(path, encoding="utf-8")
+  with source:
+    parse_into_db(product, read_reports(source, reference), workers, chunk_size)
+
+def replay(products: list[str], directory: str, start: datetime = None, end: datetime = None,
+           stations: list[str] = None, workers: int = None, chunk_size: int = 1000):
+  """
+  Re-parse the archived raw reports and bulk-upsert them, e.g. after a
+  parser fix or a new field, without requesting the upstream again.
+  """
+  from Archive import read_archive
+  for product in products:
+    reports = read_archive(
+      directory, product,
+      start.date() if start else None, end.date() if end else None,
+      set(stations) if stations else None
+    )
+    parse_into_db(product, reports, workers, chunk_size)
+
+def main():
+  for writer in writers:
+    writer.reset()
+  scrape_state.reset()
+  scrape_state.load()
+  with CYCLE_SECONDS.time():
+    airport_codes = GetAirportCodes()
+    batches = chunk_codes(airport_codes, batch_size)
+    log.info("Scraping stations", extra={"stations": len(airport_codes), "batches": len(batches), "batchSize": batch_size})
+    run_batches(batches)
+    finish_cycle()
+
 if __name__ == "__main__":
-  main()
\ No newline at end of file
+  parser = argparse.ArgumentParser(description="Scrape METAR and TAF reports into MongoDB.")
+  parser.add_argument("--daemon", action="store_true", help="keep running and refresh stations on their own cadence")
+  commands = parser.add_subparsers(dest="command")
+  backfill_parser = commands.add_parser("backfill", help="parse an archive of raw reports into MongoDB")
+  backfill_parser.add_argument("product", type=str.upper, choices=list(PRODUCTS))
+  backfill_parser.add_argument("file", help="file with one raw report per line, optionally prefixed by an ISO timestamp and a tab, - for stdin")
+  backfill_parser.add_argument("--workers", type=int, default=None, help="parser processes, defaults to the number of cores")
+  backfill_parser.add_argument("--chunk-size", type=int, default=1000, help="reports per worker task")
+  backfill_parser.add_argument("--reference", type=datetime.fromisoformat, default=None, help="reference date for lines without timestamp")
+  replay_parser = commands.add_parser("replay", help="parse the raw report archive into MongoDB again")
+  replay_parser.add_argument("products", type=str.upper, nargs="*", choices=list(PRODUCTS), help="defaults to all products")
+  replay_parser.add_argument("--archive", default=archive_dir, help="archive directory, defaults to SCRAPER_ARCHIVE_DIR")
+  replay_parser.add_argument("--from", dest="start", type=datetime.fromisoformat, default=None, help="first day to replay")
+  replay_parser.add_argument("--to", dest="end", type=datetime.fromisoformat, default=None, help="last day to replay")
+  replay_parser.add_argument("--stations", type=lambda value: value.split(","), default=None, help="comma separated station codes")
+  replay_parser.add_argument("--workers", type=int, default=None, help="parser processes, defaults to the number of cores")
+  replay_parser.add_argument("--chunk-size", type=int, default=1000, help="reports per worker task")
+  commands.add_parser("retention", help="roll up, expire and compact the condition collections")
+  args = parser.parse_args()
+  configure_logging()
+  ensure_indexes(db)
+  if metar_storage == "timeseries":
+    ensure_timeseries(db)
+  if args.command == "backfill":
+    backfill(args.product, args.file, args.workers, args.chunk_size, args.reference)
+  elif args.command == "replay":
+    if not args.archive:
+      parser.error("replay needs --archive or SCRAPER_ARCHIVE_DIR")
+    replay(args.products or list(PRODUCTS), args.archive, args.start, args.end, args.stations, args.workers, args.chunk_size)
+  elif args.command == "retention":
+    from Retention import RetentionPolicy, run_retention
+    run_retention(db, RetentionPolicy.from_env(), history_collection_name("METAR", metar_storage))
+  elif args.daemon:
+    run_daemon()
+  else:
+    main()
+  if pushgateway_url and not args.daemon:
+    push_metrics(pushgateway_url, f"scraper-{args.command}" if args.command else "scraper")
\ No newline at end of file
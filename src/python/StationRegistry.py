@@ -0,0 +1,200 @@
+import logging
+import threading
+from pymongo.errors import OperationFailure, PyMongoError
+
+log = logging.getLogger(__name__)
+
+# Backoff between reconnects after MongoDB errors
+RETRY_SECONDS = 1
+MAX_RETRY_SECONDS = 60
+
+class StationRegistry:
+  """
+  In-memory set of station codes kept current by a change stream on the
+  stations collection. Loads the collection once, falls back to polling when
+  change streams are not available (e.g. on a standalone mongod).
+
+  Args:
+      collection: the stations collection
+      poll_interval: seconds between reloads in polling mode
+  """
+  def __init__(self, collection, poll_interval: float = 300):
+    self.collection = collection
+    self.poll_interval = poll_interval
+    self.codes_by_id = {}
+    self.listeners = []
+    self.lock = threading.Lock()
+    self.stop_event = threading.Event()
+    self.thread = None
+    self.mode = None
+
+  def subscribe(self, on_add, on_remove):
+    """
+    Register callbacks invoked with the station code when a station is
+    added or removed. Called from the watcher thread.
+    """
+    self.listeners.append((on_add, on_remove))
+
+  def codes(self) -> list[str]:
+    with self.lock:
+      return list(self.codes_by_id.values())
+
+  def start(self):
+    """
+    Open the change stream before the initial load so no change in between
+    is lost, then follow it on a background thread. When MongoDB is not
+    reachable the thread keeps retrying.
+    """
+    stream = None
+    try:
+      stream = self.open_stream(None)
+      self.load()
+    except PyMongoError as e:
+      log.warning("Loading stations failed, retrying", extra={"error": str(e)})
+      if stream is not None:
+        stream.close()
+      stream = None
+    self.thread = threading.Thread(target=self.run, args=(stream,), name="station-registry", daemon=True)
+    self.thread.start()
+
+  def stop(self):
+    self.stop_event.set()
+    if self.thread:
+      self.thread.join(timeout=5)
+
+  def load(self):
+    docs = self.collection.find({}, {"code": 1})
+    self.replace({doc["_id"]: doc["code"] for doc in docs if doc.get("code")})
+
+  def replace(self, codes_by_id: dict):
+    with self.lock:
+      old = set(self.codes_by_id.values())
+      self.codes_by_id = codes_by_id
+      new = set(codes_by_id.values())
+    for code in new - old:
+      self.notify_add(code)
+    for code in old - new:
+      self.notify_remove(code)
+
+  def set_station(self, doc_id, code: str):
+    with self.lock:
+      old = self.codes_by_id.get(doc_id)
+      self.codes_by_id[doc_id] = code
+      remaining = set(self.codes_by_id.values())
+    if old and old not in remaining:
+      self.notify_remove(old)
+    if code != old:
+      self.notify_add(code)
+
+  def remove_station(self, doc_id):
+    with self.lock:
+      code = self.codes_by_id.pop(doc_id, None)
+      remaining = set(self.codes_by_id.values())
+    if code and code not in remaining:
+      self.notify_remove(code)
+
+  def notify_add(self, code: str):
+    for on_add, _ in self.listeners:
+      on_add(code)
+
+  def notify_remove(self, code: str):
+    for _, on_remove in self.listeners:
+      on_remove(code)
+
+  def open_stream(self, resume_token):
+    try:
+      stream = self.collection.watch(full_document="updateLookup", resume_after=resume_token,
+                                     max_await_time_ms=1000)
+      self.mode = "change stream"
+      return stream
+    except OperationFailure as e:
+      if resume_token is not None:
+        log.warning("Station change stream cannot be resumed, reloading", extra={"error": str(e)})
+        return None
+      log.warning("Station change stream unavailable, polling", extra={"error": str(e), "pollInterval": self.poll_interval})
+      self.mode = "polling"
+      return None
+
+  def run(self, stream):
+    """
+    Follow the change stream, reconnect with backoff on any MongoDB error
+    and fall back to polling when change streams are not supported.
+    """
+    resume_token = None
+    retry = RETRY_SECONDS
+    while not self.stop_event.is_set():
+      if self.mode == "polling":
+        self.poll()
+        return
+      try:
+        if stream is None:
+          stream = self.reconnect(resume_token)
+          if stream is None:
+            continue
+          retry = RETRY_SECONDS
+        # An invalidated stream cannot be resumed, start over with a fresh load
+        resume_token = None if self.follow(stream) else stream.resume_token
+      except PyMongoError as e:
+        log.warning("Station change stream interrupted", extra={"error": str(e), "retrySeconds": retry})
+        if stream is not None:
+          resume_token = stream.resume_token
+        self.stop_event.wait(retry)
+        retry = min(retry * 2, MAX_RETRY_SECONDS)
+      stream = None
+
+  def follow(self, stream) -> bool:
+    """
+    Apply the changes of the stream until it dies or the registry stops.
+
+    Returns:
+        whether the stream was invalidated
+    """
+    invalidated = False
+    with stream:
+      while not self.stop_event.is_set() and stream.alive:
+        change = stream.try_next()
+        if change is not None:
+          invalidated = change["operationType"] == "invalidate"
+          self.apply(change)
+    return invalidated
+
+  def reconnect(self, resume_token):
+    """
+    Open the change stream again, resuming after the token if possible and
+    with a fresh load otherwise.
+
+    Returns:
+        the stream, or None when change streams are not available
+    """
+    stream = self.open_stream(resume_token) if resume_token else None
+    if stream is None:
+      stream = self.open_stream(None)
+      if stream is not None:
+        try:
+          self.load()
+        except PyMongoError:
+          stream.close()
+          raise
+    return stream
+
+  def apply(self, change: dict):
+    operation = change["operationType"]
+    doc_id = change.get("documentKey", {}).get("_id")
+    if operation in ("insert", "update", "replace"):
+      doc = change.get("fullDocument")
+      if doc and doc.get("code"):
+        self.set_station(doc_id, doc["code"])
+      else:
+        self.remove_station(doc_id)
+    elif operation == "delete":
+      self.remove_station(doc_id)
+    elif operation in ("drop", "rename", "dropDatabase"):
+      self.replace({})
+
+  def poll(self):
+    self.mode = "polling"
+    while not self.stop_event.wait(self.poll_interval):
+      try:
+        self.load()
+      except PyMongoError as e:
+        log.warning("Reloading stations failed", extra={"error": str(e)})
@@ -0,0 +1,236 @@
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, CollectionInvalid, PyMongoError
+from Metrics import WRITE_SECONDS, configure_logging
+import argparse
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
+
+# "documents": METAR history is read from metar_conditions (one document per report)
+# "timeseries": the scraper also writes metar_timeseries and the API reads history from it
+STORAGE_MODES = ("documents", "timeseries")
+METAR_TIMESERIES = "metar_timeseries"
+
+# Condition collection per product, holds the latest reports in every mode
+CONDITION_COLLECTIONS = {"METAR": "metar_conditions", "TAF": "taf_conditions"}
+
+# Aggregated MetarConditions field -> stored numeric field
+AGGREGATE_FIELDS = {
+  "temperature": "temperature",
+  "dewPoint": "dewPoint",
+  "windSpeed": "windSpeed",
+  "visibility": "visibilityMeters",
+}
+
+def metar_bucket_stages(match: dict, unit: str, bin_size: int) -> list[dict]:
+  """
+  Pipeline stages grouping the matching METARs per station and time bucket
+  with count and min, max, mean and count of every AGGREGATE_FIELDS field.
+  The bucket is {"station", "start"} in _id.
+  """
+  group = {
+    "_id": {"station": "$station", "start": {"$dateTrunc": {"date": "$issueTime", "unit": unit, "binSize": bin_size}}},
+    "count": {"$sum": 1}
+  }
+  for name, field in AGGREGATE_FIELDS.items():
+    # min/max/avg skip missing values, the count has to do the same
+    group[f"{name}Min"] = {"$min": f"${field}"}
+    group[f"{name}Max"] = {"$max": f"${field}"}
+    group[f"{name}Mean"] = {"$avg": f"${field}"}
+    group[f"{name}Count"] = {"$sum": {"$cond": [{"$isNumber": f"${field}"}, 1, 0]}}
+  return [
+    {"$match": match},
+    {"$project": {"station": 1, "issueTime": 1, **{field: 1 for field in AGGREGATE_FIELDS.values()}}},
+    {"$group": group},
+  ]
+
+def storage_mode() -> str:
+  mode = os.environ.get("METAR_STORAGE", "documents")
+  if mode not in STORAGE_MODES:
+    raise EnvironmentError(f"METAR_STORAGE must be one of {', '.join(STORAGE_MODES)}, not {mode}.")
+  return mode
+
+def history_collection_name(product: str, mode: str) -> str:
+  """
+  Collection the history of a product is read from.
+  """
+  if product == "METAR" and mode == "timeseries":
+    return METAR_TIMESERIES
+  return CONDITION_COLLECTIONS[product]
+
+def ensure_timeseries(db):
+  """
+  Create the METAR time-series collection with station as metaField and
+  issueTime as timeField. METARs come every 30 minutes, "hours" keeps up
+  to 30 days of a station in one compressed bucket.
+  """
+  try:
+    db.create_collection(METAR_TIMESERIES, timeseries={
+      "timeField": "issueTime",
+      "metaField": "station",
+      "granularity": "hours"
+    })
+  except CollectionInvalid:
+    pass  # already exists
+  # Time-series collections have no unique indexes, TimeSeriesWriter skips duplicates itself
+  db[METAR_TIMESERIES].create_index([("station", ASCENDING), ("issueTime", DESCENDING)], name="station_issueTime")
+
+class TimeSeriesWriter:
+  """
+  Buffers METARs for the time-series collection and inserts them in
+  batches. Time-series collections can neither upsert nor enforce a unique
+  index, so every batch first looks up which (station, issueTime) pairs
+  already exist and only inserts the new ones. Same interface as
+  Scraper.ConditionWriter and safe to share between threads.
+
+  With replace set (backfills and replays) the existing documents of the
+  batch's pairs are deleted and re-inserted instead, so corrected parses
+  overwrite the history. Deleting from a time-series collection by fields
+  other than the metaField needs MongoDB 7.0.
+
+  on_written callbacks are called once a document is stored (or already
+  existed) and never for a failed write.
+  """
+  def __init__(self, collection, batch_size: int, replace: bool = False):
+    self.collection = collection
+    self.batch_size = max(1, batch_size)
+    self.replace = replace
+    self.pending = []
+    self.lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    self.inserted = 0
+    self.skipped = 0
+    self.errors = 0
+
+  def add(self, conditions, on_written=None):
+    self.add_document(conditions.to_dict(), on_written)
+
+  def add_document(self, doc: dict, on_written=None):
+    with self.lock:
+      self.pending.append((doc, on_written))
+      if len(self.pending) < self.batch_size:
+        return
+      batch, self.pending = self.pending, []
+    self.write(batch)
+
+  def flush(self):
+    with self.lock:
+      batch, self.pending = self.pending, []
+    if batch:
+      self.write(batch)
+
+  def write(self, batch: list[tuple]):
+    try:
+      with WRITE_SECONDS.labels(self.collection.name).time():
+        failed = self.insert_new([doc for doc, _ in batch])
+    except PyMongoError as e:
+      log.error("Bulk insert failed", extra={"collection": self.collection.name, "documents": len(batch), "error": str(e)})
+      with self.lock:
+        self.errors += len(batch)
+      return
+    for index, (_, on_written) in enumerate(batch):
+      if on_written and index not in failed:
+        on_written()
+
+  def insert_new(self, batch: list[dict]) -> set[int]:
+    """
+    Insert the documents of the batch which do not exist yet, or with
+    replace set delete the existing ones first and insert all of them.
+
+    Returns:
+        positions in the batch of the documents that failed
+    """
+    if self.replace:
+      # The last document of a pair in the batch wins
+      latest = {(doc["station"], doc["issueTime"]): index for index, doc in enumerate(batch)}
+      self.collection.delete_many({"$or": [{"station": station, "issueTime": issue_time} for station, issue_time in latest]})
+      positions = sorted(latest.values())
+      new = [batch[index] for index in positions]
+    else:
+      existing = {
+        (doc["station"], doc["issueTime"])
+        for doc in self.collection.find(
+          {
+            "station": {"$in": list({doc["station"] for doc in batch})},
+            "issueTime": {"$in": list({doc["issueTime"] for doc in batch})}
+          },
+          {"_id": 0, "station": 1, "issueTime": 1}
+        )
+      }
+      new = []
+      positions = []
+      for index, doc in enumerate(batch):
+        key = (doc["station"], doc["issueTime"])
+        if key not in existing:
+          existing.add(key)
+          new.append(doc)
+          positions.append(index)
+    inserted, failed = len(new), set()
+    if new:
+      try:
+        self.collection.insert_many(new, ordered=False)
+      except BulkWriteError as e:
+        failed = {positions[error["index"]] for error in e.details["writeErrors"]}
+        inserted = e.details["nInserted"]
+        log.warning("Bulk insert failed for some documents", extra={"collection": self.collection.name, "errors": len(failed)})
+    with self.lock:
+      self.inserted += inserted
+      self.skipped += len(batch) - len(new)
+      self.errors += len(failed)
+    return failed
+
+  def summary(self) -> str:
+    return f"{self.collection.name}: inserted {self.inserted}, skipped {self.skipped}, errors {self.errors}"
+
+def migrate(db, batch_size: int = 1000) -> TimeSeriesWriter:
+  """
+  Copy metar_conditions into the time-series collection. Existing reports
+  are skipped, so an interrupted migration can simply be run again.
+  """
+  ensure_timeseries(db)
+  writer = TimeSeriesWriter(db[METAR_TIMESERIES], batch_size)
+  copied = 0
+  for doc in db["metar_conditions"].find({}, {"_id": 0}).sort("_id", ASCENDING).batch_size(batch_size):
+    writer.add_document(doc)
+    copied += 1
+    if copied % (batch_size * 100) == 0:
+      log.info("Migration progress", extra={"copied": copied})
+  writer.flush()
+  return writer
+
+def storage_stats(db) -> dict[str, dict]:
+  """
+  Document count and sizes in bytes of the METAR history collections.
+  """
+  stats = {}
+  for collection_name in ("metar_conditions", METAR_TIMESERIES):
+    if collection_name not in db.list_collection_names():
+      continue
+    raw = db.command("collStats", collection_name)
+    stats[collection_name] = {
+      "count": db[collection_name].estimated_document_count(),
+      "size": raw.get("size"),
+      "storageSize": raw.get("storageSize"),
+      "totalIndexSize": raw.get("totalIndexSize"),
+    }
+  return stats
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Manage the METAR time-series storage.")
+  commands = parser.add_subparsers(dest="command", required=True)
+  migrate_parser = commands.add_parser("migrate", help="copy metar_conditions into metar_timeseries")
+  migrate_parser.add_argument("--batch-size", type=int, default=1000)
+  commands.add_parser("stats", help="print the size of both METAR layouts")
+  args = parser.parse_args()
+  configure_logging()
+
+  client = MongoClient(os.environ.get("MONGO_URI", "mongodb://localhost:27017"))
+  db = client["aviation"]
+  if args.command == "migrate":
+    print(migrate(db, args.batch_size).summary())
+  for collection_name, stats in storage_stats(db).items():
+    print(f"{collection_name:<18} " + ", ".join(f"{key} {value}" for key, value in stats.items()))
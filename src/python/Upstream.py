@@ -0,0 +1,77 @@
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# Status codes worth retrying, everything else is raised right away
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+  """
+  Thread safe token bucket limiting the request rate to a single host.
+
+  Args:
+      rate: tokens added per second, <= 0 disables the limit
+      capacity: maximum burst size
+  """
+  def __init__(self, rate: float, capacity: int = 1):
+    self.rate = rate
+    self.capacity = max(1, capacity)
+    self.tokens = float(self.capacity)
+    self.updated = time.monotonic()
+    self.lock = threading.Lock()
+
+  def acquire(self):
+    if self.rate <= 0:
+      return
+    while True:
+      with self.lock:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+          self.tokens -= 1
+          return
+        wait = (1 - self.tokens) / self.rate
+      time.sleep(wait)
+
+class UpstreamClient:
+  """
+  Pooled HTTP client for the weather API shared by all scraper threads.
+
+  Keeps connections alive in a single requests.Session, throttles with a
+  TokenBucket and retries failed requests with jittered exponential backoff.
+  """
+  def __init__(self, pool_size: int = 4, rate: float = 5.0, burst: int = 5,
+               retries: int = 3, backoff: float = 0.5, timeout: float = 30.0):
+    self.session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+    self.session.mount("http://", adapter)
+    self.session.mount("https://", adapter)
+    self.bucket = TokenBucket(rate, burst)
+    self.retries = max(0, retries)
+    self.backoff = backoff
+    self.timeout = timeout
+
+  def backoff_delay(self, attempt: int) -> float:
+    # Full jitter: uniform between 0 and the exponential ceiling
+    return random.uniform(0, self.backoff * (2 ** attempt))
+
+  def get(self, url: str, headers: dict = None) -> requests.Response:
+    attempt = 0
+    while True:
+      self.bucket.acquire()
+      try:
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code not in RETRY_STATUS_CODES or attempt >= self.retries:
+          response.raise_for_status()
+          return response
+      except (requests.ConnectionError, requests.Timeout):
+        if attempt >= self.retries:
+          raise
+      time.sleep(self.backoff_delay(attempt))
+      attempt += 1
+
+  def close(self):
+    self.session.close()
@@ -0,0 +1,141 @@
+# Micro-benchmark of the __slots__ model classes against the previous __dict__ based ones
+# Run from src/python: python benchmarks/bench_models.py
+import os
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from MetarTaf import MetarConditions, TAFConditions, TAFTrend
+
+def strip_mongo_id(doc):
+  doc = dict(doc)
+  doc.pop("_id", None)
+  return doc
+
+class DictMetarConditions:
+  def __init__(self, station=None, issueTime=None, windSpeed=None, windDirection=None,
+               windDegrees=None, temperature=None, dewPoint=None, visibility=None):
+    self.station = station
+    self.issueTime = issueTime
+    self.windSpeed = windSpeed
+    self.windDirection = windDirection
+    self.windDegrees = windDegrees
+    self.temperature = temperature
+    self.dewPoint = dewPoint
+    self.visibility = visibility
+
+  def to_dict(self):
+    return {k: v for k, v in self.__dict__.items() if v is not None}
+
+  @staticmethod
+  def from_dict(data):
+    return DictMetarConditions(**strip_mongo_id(data))
+
+class DictTAFTrend:
+  def __init__(self, validityStart=None, validityEnd=None, visibilityDistance=None,
+               cloudHeights=None, windSpeed=None, windDirection=None, windDegrees=None):
+    self.validityStart = validityStart
+    self.validityEnd = validityEnd
+    self.visibilityDistance = visibilityDistance
+    self.cloudHeights = cloudHeights or []
+    self.windSpeed = windSpeed
+    self.windDirection = windDirection
+    self.windDegrees = windDegrees
+
+  def to_dict(self):
+    raw = {
+      "validityStart": self.validityStart,
+      "validityEnd": self.validityEnd,
+      "visibilityDistance": self.visibilityDistance,
+      "cloudHeights": self.cloudHeights,
+      "windSpeed": self.windSpeed,
+      "windDirection": self.windDirection,
+      "windDegrees": self.windDegrees
+    }
+    return {k: v for k, v in raw.items() if v is not None}
+
+  @staticmethod
+  def from_dict(data):
+    return DictTAFTrend(**strip_mongo_id(data))
+
+class DictTAFConditions:
+  def __init__(self, station=None, issueTime=None, maxTemperature=None, minTemperature=None,
+               windSpeed=None, windDirection=None, windDegrees=None, visibility=None, trends=None):
+    self.station = station
+    self.issueTime = issueTime
+    self.maxTemperature = maxTemperature
+    self.minTemperature = minTemperature
+    self.windSpeed = windSpeed
+    self.windDirection = windDirection
+    self.windDegrees = windDegrees
+    self.visibility = visibility
+    self.trends = trends or []
+
+  def to_dict(self):
+    raw = {
+      "station": self.station,
+      "issueTime": self.issueTime,
+      "maxTemperature": self.maxTemperature,
+      "minTemperature": self.minTemperature,
+      "windSpeed": self.windSpeed,
+      "windDirection": self.windDirection,
+      "windDegrees": self.windDegrees,
+      "visibility": self.visibility,
+      "trends": [trend.to_dict() for trend in self.trends] if self.trends else []
+    }
+    return {k: v for k, v in raw.items() if v is not None}
+
+  @staticmethod
+  def from_dict(data):
+    return DictTAFConditions(
+      station=data.get("station"),
+      issueTime=data.get("issueTime"),
+      maxTemperature=data.get("maxTemperature"),
+      minTemperature=data.get("minTemperature"),
+      windSpeed=data.get("windSpeed"),
+      windDirection=data.get("windDirection"),
+      windDegrees=data.get("windDegrees"),
+      visibility=data.get("visibility"),
+      trends=[DictTAFTrend.from_dict(trend) for trend in data.get("trends", [])]
+    )
+
+NOW = datetime(2024, 3, 1, 12, 50)
+METAR_DOC = {"_id": "0" * 24, "station": "LOWW", "issueTime": NOW, "windSpeed": 8, "windDirection": "W",
+             "windDegrees": 280, "temperature": 12, "dewPoint": 5, "visibility": ">10000"}
+TREND_DOC = {"validityStart": NOW, "validityEnd": NOW, "visibilityDistance": "4000",
+             "cloudHeights": [1200, 3000], "windSpeed": 15, "windDirection": "WNW", "windDegrees": 300}
+TAF_DOC = {"_id": "0" * 24, "station": "LOWW", "issueTime": NOW, "windSpeed": 10, "windDirection": "WNW",
+           "windDegrees": 290, "visibility": ">10000", "trends": [TREND_DOC] * 3}
+
+def measure_memory(factory, count: int) -> float:
+  tracemalloc.start()
+  objects = [factory() for _ in range(count)]
+  size, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  del objects
+  return size / count
+
+def measure_time(statement, number: int) -> float:
+  return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+def compare(name: str, dict_cls, slots_cls, doc: dict):
+  dict_obj, slots_obj = dict_cls.from_dict(doc), slots_cls.from_dict(doc)
+  assert dict_obj.to_dict() == slots_obj.to_dict()
+  rows = [
+    ("bytes/object", measure_memory(lambda: dict_cls.from_dict(doc), 10000),
+                     measure_memory(lambda: slots_cls.from_dict(doc), 10000)),
+    ("from_dict us", measure_time(lambda: dict_cls.from_dict(doc), 20000),
+                     measure_time(lambda: slots_cls.from_dict(doc), 20000)),
+    ("to_dict us", measure_time(dict_obj.to_dict, 20000),
+                   measure_time(slots_obj.to_dict, 20000)),
+  ]
+  print(name)
+  for label, before, after in rows:
+    print(f"  {label:<14} __dict__ {before:9.2f}  __slots__ {after:9.2f}  ({(after / before - 1) * 100:+6.1f}%)")
+
+if __name__ == "__main__":
+  compare("MetarConditions", DictMetarConditions, MetarConditions, METAR_DOC)
+  compare("TAFTrend", DictTAFTrend, TAFTrend, TREND_DOC)
+  compare("TAFConditions", DictTAFConditions, TAFConditions, TAF_DOC)
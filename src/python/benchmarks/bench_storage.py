@@ -0,0 +1,85 @@
+# Storage size and range-scan latency of the METAR layouts, needs a MongoDB 5.0+:
+#   MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_storage.py --stations 100 --days 90
+# Writes synthetic METARs into a scratch database in both layouts, the database is dropped afterwards.
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pymongo import MongoClient
+from Indexes import ensure_indexes
+from MetarTaf import MetarConditions
+from Storage import METAR_TIMESERIES, TimeSeriesWriter, ensure_timeseries, storage_stats
+
+def percentile(values: list[float], p: float) -> float:
+  values = sorted(values)
+  return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def synthetic_metars(stations: list[str], start: datetime, days: int):
+  # One METAR every 30 minutes per station, like the real feed
+  for step in range(days * 48):
+    issue_time = start + timedelta(minutes=30 * step)
+    for station in stations:
+      temperature = random.randint(-10, 30)
+      yield MetarConditions(
+        station, issue_time, random.randint(0, 30), "W", random.randint(0, 35) * 10,
+        temperature, temperature - random.randint(0, 8), "9999",
+        f"At station {station} on {issue_time:%Y-%m-%d} at {issue_time:%H:%M} UTC the wind speed is ...", 1, 9999
+      )
+
+def time_range_scans(collection, stations: list[str], start: datetime, days: int, window_days: int, runs: int) -> dict:
+  latencies = []
+  for _ in range(runs):
+    begin = start + timedelta(days=random.randint(0, max(0, days - window_days)))
+    query = {"station": random.choice(stations), "issueTime": {"$gte": begin, "$lt": begin + timedelta(days=window_days)}}
+    started = time.perf_counter()
+    list(collection.find(query).sort("issueTime", -1))
+    latencies.append((time.perf_counter() - started) * 1000)
+  return {"p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95)}
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Compare the document and time-series METAR layouts.")
+  parser.add_argument("--stations", type=int, default=50)
+  parser.add_argument("--days", type=int, default=30)
+  parser.add_argument("--window-days", type=int, default=7, help="length of the scanned time range")
+  parser.add_argument("--runs", type=int, default=200, help="range scans per layout")
+  parser.add_argument("--output", help="write the results as JSON to this file")
+  args = parser.parse_args()
+
+  client = MongoClient(os.environ.get("MONGO_URI", "mongodb://localhost:27017"))
+  client.drop_database("aviation_storage_bench")
+  db = client["aviation_storage_bench"]
+  try:
+    ensure_indexes(db)
+    ensure_timeseries(db)
+    stations = [f"S{i:03d}" for i in range(args.stations)]
+    start = datetime(2024, 1, 1)
+
+    series_writer = TimeSeriesWriter(db[METAR_TIMESERIES], 1000)
+    batch = []
+    for conditions in synthetic_metars(stations, start, args.days):
+      batch.append(conditions.to_dict())
+      series_writer.add(conditions)
+      if len(batch) == 1000:
+        db.metar_conditions.insert_many(batch)
+        batch = []
+    if batch:
+      db.metar_conditions.insert_many(batch)
+    series_writer.flush()
+
+    result = {"stations": args.stations, "days": args.days, "layouts": storage_stats(db)}
+    for collection_name in ("metar_conditions", METAR_TIMESERIES):
+      result["layouts"][collection_name]["rangeScan"] = time_range_scans(
+        db[collection_name], stations, start, args.days, args.window_days, args.runs
+      )
+  finally:
+    client.drop_database("aviation_storage_bench")
+
+  print(json.dumps(result, indent=2))
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(result, f, indent=2)
@@ -0,0 +1,51 @@
+# Compares two results of run_benchmarks.py, run from src/python:
+#   python benchmarks/compare.py benchmarks/results/<base>.json benchmarks/results/<head>.json --threshold 1.10
+# Exits with 1 if a benchmark of head is slower than threshold times base, e.g. in CI.
+import argparse
+import json
+import sys
+
+def load(path: str) -> dict:
+  with open(path) as f:
+    return json.load(f)
+
+def compare(base: dict, head: dict, threshold: float) -> list[str]:
+  """
+  Print base and head time per item of every benchmark in both results.
+
+  Returns:
+      names of the regressed benchmarks
+  """
+  print(f"{'benchmark':<32} {base['commit']:>12} {head['commit']:>12}     ratio")
+  regressions = []
+  for name, result in head["benchmarks"].items():
+    before = base["benchmarks"].get(name)
+    if before is None or "skipped" in before or "skipped" in result:
+      print(f"{name:<32} {'-':>12} {'-':>12}")
+      continue
+    ratio = result["per_item_us"] / before["per_item_us"]
+    marker = ""
+    if ratio > threshold:
+      regressions.append(name)
+      marker = "  slower"
+    elif ratio < 1 / threshold:
+      marker = "  faster"
+    print(f"{name:<32} {before['per_item_us']:>10.1f}us {result['per_item_us']:>10.1f}us {ratio:>9.2f}{marker}")
+  return regressions
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Compare two benchmark results.")
+  parser.add_argument("base")
+  parser.add_argument("head")
+  parser.add_argument("--threshold", type=float, default=1.10, help="head/base ratio counted as regression")
+  args = parser.parse_args()
+
+  base, head = load(args.base), load(args.head)
+  if (base["python"], base["machine"]) != (head["python"], head["machine"]):
+    print(f"Warning: results from different environments ({base['python']} {base['machine']}, {head['python']} {head['machine']})")
+  if base.get("corpus") != head.get("corpus"):
+    print(f"Warning: results from different corpora ({base.get('corpus', 'unknown')}, {head.get('corpus', 'unknown')})")
+  regressions = compare(base, head, args.threshold)
+  if regressions:
+    print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+    sys.exit(1)
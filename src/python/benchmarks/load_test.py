@@ -0,0 +1,88 @@
+# HTTP load test for a running ReportApi, e.g. against a local mongod:
+#   MONGO_URI=mongodb://localhost:27017 uvicorn ReportApi:app --port 8000
+#   python benchmarks/load_test.py --url http://localhost:8000 --concurrency 64 --duration 30
+# Run it once per build (git checkout <commit>) to compare p99 latency and RPS.
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+def percentile(values: list[float], p: float) -> float:
+  if not values:
+    return 0.0
+  values = sorted(values)
+  return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def build_requests(stations: list[str]) -> list[tuple[str, str, str]]:
+  """
+  Mix of (method, path, body) similar to the UI traffic.
+  """
+  query = json.dumps({"stations": stations})
+  return [
+    ("GET", f"/metar/{random.choice(stations)}", None),
+    ("POST", "/metar/query", query),
+    ("POST", "/taf/query", query),
+    ("GET", "/stations", None),
+  ]
+
+def worker(url, requests: list, deadline: float, latencies: list, errors: list, lock: threading.Lock):
+  connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+  local_latencies, local_errors = [], 0
+  while time.perf_counter() < deadline:
+    method, path, body = random.choice(requests)
+    headers = {"Content-Type": "application/json"} if body else {}
+    start = time.perf_counter()
+    try:
+      connection.request(method, path, body=body, headers=headers)
+      response = connection.getresponse()
+      response.read()
+      if response.status >= 500:
+        local_errors += 1
+    except (OSError, http.client.HTTPException):
+      local_errors += 1
+      connection.close()
+      connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+      continue
+    local_latencies.append((time.perf_counter() - start) * 1000)
+  connection.close()
+  with lock:
+    latencies.extend(local_latencies)
+    errors.append(local_errors)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Load test the Report API.")
+  parser.add_argument("--url", default="http://localhost:8000")
+  parser.add_argument("--concurrency", type=int, default=32, help="parallel keep-alive connections")
+  parser.add_argument("--duration", type=float, default=20, help="seconds")
+  parser.add_argument("--stations", default="LOWW,LOWS,LOWI,LOWG,LOWL,LOWK,EDDM,EDDF,EHAM,EGLL")
+  parser.add_argument("--output", help="write the results as JSON to this file")
+  args = parser.parse_args()
+
+  url = urlparse(args.url)
+  requests = build_requests(args.stations.split(","))
+  latencies, errors, lock = [], [], threading.Lock()
+  deadline = time.perf_counter() + args.duration
+  threads = [
+    threading.Thread(target=worker, args=(url, requests, deadline, latencies, errors, lock))
+    for _ in range(args.concurrency)
+  ]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  result = {
+    "requests": len(latencies),
+    "errors": sum(errors),
+    "rps": len(latencies) / args.duration,
+    "p50_ms": percentile(latencies, 50),
+    "p95_ms": percentile(latencies, 95),
+    "p99_ms": percentile(latencies, 99),
+  }
+  print(json.dumps(result, indent=2))
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(result, f, indent=2)
@@ -0,0 +1,177 @@
+# Builds the benchmark corpus in benchmarks/corpus, run from src/python:
+#   python benchmarks/make_corpus.py                          synthetic reports (the bundled corpus)
+#   python benchmarks/make_corpus.py --archive /data/archive  real reports from the scraper archive
+# Synthetic reports follow the group mix of real-world METAR/TAF traffic (US and ICAO formats,
+# gusts, variable winds, weather, cloud layers, NOSIG/BECMG/TEMPO/PROB/FM trends) and
+# are seeded, so every checkout benchmarks exactly the same input. The groups are drawn
+# independently, so reports combine things real ones never do (fog with 9999, snow at 30
+# degrees). They measure throughput of the code paths, not real traffic, and the results
+# are labeled with the corpus source in corpus/source.txt.
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from MetarTaf import parse_metar_uncached, parse_taf_uncached
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+ICAO_STATIONS = (
+  "LOWW LOWS LOWI LOWG LOWL LOWK EDDM EDDF EDDB EDDH EDDK EDDL EDDS EDDN EDDP LSZH LSGG LSZB "
+  "LFPG LFPO LFLL LFML LFMN LFBO EGLL EGKK EGSS EGCC EGPH EGPF EIDW EHAM EBBR ELLX LEMD LEBL "
+  "LEPA LEMG LPPT LPPR LIRF LIMC LIPZ LIRN LGAV LTFM LKPR LZIB LHBP EPWA EPKK LJLJ LDZA LROP "
+  "LBSF LYBE EKCH ESSA ENGM EFHK BIKF UUEE OMDB OTHH LLBG HECA FAOR"
+).split()
+US_STATIONS = (
+  "KJFK KLGA KEWR KBOS KORD KMDW KATL KDFW KDEN KLAX KSFO KSEA KPHX KLAS KMIA KMCO KIAH KMSP "
+  "KDTW KPHL KCLT KBWI KIAD KDCA KSLC KSAN KTPA KPDX KSTL KMCI CYYZ CYVR CYUL"
+).split()
+
+WEATHER = ["", "", "", "", "-RA", "RA", "+RA", "-SHRA", "SHRA", "BR", "FG", "BCFG", "HZ", "-SN", "SN",
+           "-DZ", "TSRA", "VCSH", "VCTS", "-FZRA", "FZFG", "-RASN"]
+COVER = ["FEW", "SCT", "BKN", "OVC"]
+
+def wind(rng: random.Random) -> str:
+  if rng.random() < 0.08:
+    return "00000KT"
+  speed = rng.choice([rng.randint(2, 12), rng.randint(8, 25)])
+  if rng.random() < 0.1:
+    return f"VRB{min(speed, 5):02d}KT"
+  direction = rng.randrange(10, 361, 10)
+  gust = f"G{speed + rng.randint(8, 18):02d}" if rng.random() < 0.15 else ""
+  group = f"{direction:03d}{speed:02d}{gust}KT"
+  if rng.random() < 0.1:
+    group += f" {(direction - 40) % 360:03d}V{(direction + 40) % 360:03d}"
+  return group
+
+def clouds(rng: random.Random) -> str:
+  if rng.random() < 0.15:
+    return rng.choice(["NSC", "SKC", "CLR"])
+  heights = sorted(rng.sample(range(3, 250), rng.randint(1, 3)))
+  layers = [f"{rng.choice(COVER)}{height:03d}" for height in heights]
+  if rng.random() < 0.07:
+    layers[0] += rng.choice(["CB", "TCU"])
+  return " ".join(layers)
+
+def temperature(value: int) -> str:
+  return f"M{-value:02d}" if value < 0 else f"{value:02d}"
+
+def visibility(rng: random.Random, us: bool) -> str:
+  if us:
+    return rng.choice(["10SM", "10SM", "10SM", "7SM", "5SM", "3SM", "2 1/2SM", "1 1/2SM", "1/2SM", "M1/4SM"])
+  return rng.choice(["9999", "9999", "9999", "8000", "6000", "4500", "3000", "1500", "0800", "0300"])
+
+def metar(rng: random.Random, station: str) -> str:
+  us = station[0] in "KC"
+  day, hour = rng.randint(1, 28), rng.randint(0, 23)
+  minute = rng.choice([20, 50]) if station[0] in "LE" else 51
+  temp = rng.randint(-15, 35)
+  dew = temp - rng.randint(0, 12)
+  parts = [station, f"{day:02d}{hour:02d}{minute:02d}Z"]
+  if rng.random() < 0.05:
+    parts.append("AUTO")
+  parts.append(wind(rng))
+  if not us and rng.random() < 0.2:
+    parts.append("CAVOK")
+  else:
+    parts.append(visibility(rng, us))
+    weather = rng.choice(WEATHER)
+    if weather:
+      parts.append(weather)
+    parts.append(clouds(rng))
+  parts.append(f"{temperature(temp)}/{temperature(dew)}")
+  if us:
+    parts.append(f"A{rng.randint(2950, 3050)}")
+    temp_sign, dew_sign = int(temp < 0), int(dew < 0)
+    parts.append(f"RMK AO2 SLP{rng.randint(100, 300):03d} T{temp_sign}{abs(temp) * 10:03d}{dew_sign}{abs(dew) * 10:03d}")
+  else:
+    parts.append(f"Q{rng.randint(985, 1040):04d}")
+    parts.append(rng.choice(["NOSIG", "NOSIG", "", f"BECMG {visibility(rng, False)}", f"TEMPO {rng.choice(WEATHER[4:])}"]).strip())
+  return " ".join(part for part in parts if part)
+
+def period(day: int, start: int, hours: int) -> str:
+  end_day, end_hour = day + (start + hours) // 24, (start + hours) % 24
+  if end_hour == 0:
+    end_day, end_hour = end_day - 1, 24
+  return f"{day:02d}{start:02d}/{end_day:02d}{end_hour:02d}"
+
+def taf(rng: random.Random, station: str) -> str:
+  us = station[0] in "KC"
+  day, issue = rng.randint(1, 27), rng.choice([5, 11, 17, 23])
+  start = (issue + 1) % 24
+  day_start = day + (1 if start == 0 else 0)
+  length = 24 if us or rng.random() < 0.5 else 30
+  parts = ["TAF"]
+  if rng.random() < 0.1:
+    parts.append("AMD")
+  parts += [station, f"{day:02d}{issue:02d}{rng.choice([0, 30, 40]):02d}Z", period(day_start, start, length),
+            wind(rng), visibility(rng, us), clouds(rng)]
+  offset = 0
+  for _ in range(rng.randint(1, 4)):
+    offset += rng.randint(2, 6)
+    if offset >= length - 2:
+      break
+    hour = (start + offset) % 24
+    trend_day = day_start + (start + offset) // 24
+    kind = rng.choice(["BECMG", "TEMPO", "PROB30 TEMPO", "PROB40", "FM"])
+    if kind == "FM" and us:
+      parts += [f"FM{trend_day:02d}{hour:02d}00", wind(rng), visibility(rng, us), clouds(rng)]
+    elif kind != "FM":
+      parts += [kind, period(trend_day, hour, rng.randint(2, 4)), visibility(rng, us)]
+      weather = rng.choice(WEATHER[4:])
+      parts.append(weather)
+      parts.append(clouds(rng))
+  if not us:
+    high = rng.randint(-5, 35)
+    parts += [f"TX{temperature(high)}/{day_start:02d}{(start + 6) % 24:02d}Z",
+              f"TN{temperature(high - rng.randint(3, 15))}/{day_start + 1:02d}{(start + 18) % 24:02d}Z"]
+  return " ".join(parts)
+
+def generate(count: int, build, parse, seed: int) -> list[str]:
+  rng = random.Random(seed)
+  stations = ICAO_STATIONS + US_STATIONS
+  reports = []
+  while len(reports) < count:
+    report = build(rng, rng.choice(stations))
+    # Only reports the parser accepts, the benchmarks measure parsing and not error handling
+    if parse(report) is not None:
+      reports.append(report)
+  return reports
+
+def from_archive(directory: str, product: str, count: int) -> list[str]:
+  from Archive import read_archive
+  reports = []
+  for raw, _ in read_archive(directory, product):
+    reports.append(raw)
+    if len(reports) >= count:
+      break
+  return reports
+
+def write(name: str, reports: list[str]):
+  os.makedirs(CORPUS_DIR, exist_ok=True)
+  path = os.path.join(CORPUS_DIR, name)
+  with open(path, "w", encoding="utf-8") as f:
+    f.writelines(report + "\n" for report in reports)
+  print(f"Wrote {len(reports)} reports to {path}")
+
+def write_source(source: str):
+  with open(os.path.join(CORPUS_DIR, "source.txt"), "w", encoding="utf-8") as f:
+    f.write(source + "\n")
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Build the benchmark corpus.")
+  parser.add_argument("--metars", type=int, default=5000)
+  parser.add_argument("--tafs", type=int, default=2000)
+  parser.add_argument("--seed", type=int, default=20240301)
+  parser.add_argument("--archive", help="take real reports from this SCRAPER_ARCHIVE_DIR instead")
+  args = parser.parse_args()
+
+  if args.archive:
+    write("metar.txt", from_archive(args.archive, "METAR", args.metars))
+    write("taf.txt", from_archive(args.archive, "TAF", args.tafs))
+    write_source("archive")
+  else:
+    write("metar.txt", generate(args.metars, metar, parse_metar_uncached, args.seed))
+    write("taf.txt", generate(args.tafs, taf, parse_taf_uncached, args.seed + 1))
+    write_source("synthetic")
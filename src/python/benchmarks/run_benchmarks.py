@@ -0,0 +1,273 @@
+# Benchmark suite of the parser, model, API and scraper hot paths, run from src/python:
+#   python benchmarks/run_benchmarks.py                        all benchmarks, results/<commit>.json
+#   python benchmarks/run_benchmarks.py --filter parse --repeat 10
+#   python benchmarks/compare.py results/<base>.json results/<head>.json
+# The API and scraper benchmarks run against mongomock and a local stub of the weather API,
+# they need the packages in benchmarks/requirements.txt and are skipped without them.
+import argparse
+import asyncio
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, ".."))
+# Module level configuration of the scraper, read on import
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("SCRAPER_RATE_LIMIT", "0")
+os.environ.setdefault("SCRAPER_ARCHIVE_DIR", "")
+# ReportApi configures logging on import, keep the request logs out of the results
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from MetarTaf import (MetarConditions, TAFConditions, configure_parse_cache, parse_metar_conditions,
+                      parse_taf_conditions, taf_parser, validity_to_datetimes)
+from Describe import render_metar, render_taf
+
+# Reports are anchored to this date, so the results do not depend on the day of the run
+REFERENCE = datetime(2024, 3, 15)
+
+# name -> setup function returning (function to time, items processed per call)
+BENCHMARKS = {}
+
+def benchmark(name: str):
+  def register(setup):
+    BENCHMARKS[name] = setup
+    return setup
+  return register
+
+def load_corpus(name: str) -> list[str]:
+  with open(os.path.join(BENCHMARK_DIR, "corpus", name), encoding="utf-8") as f:
+    return [line.strip() for line in f if line.strip()]
+
+def corpus_source() -> str:
+  """
+  "synthetic" for generated reports, "archive" for real ones, see make_corpus.py.
+  """
+  path = os.path.join(BENCHMARK_DIR, "corpus", "source.txt")
+  if not os.path.exists(path):
+    return "unknown"
+  with open(path, encoding="utf-8") as f:
+    return f.read().strip()
+
+def parsed_metars() -> list[MetarConditions]:
+  configure_parse_cache(0)
+  return [render_metar(metar) for metar in (parse_metar_conditions(raw, REFERENCE) for raw in load_corpus("metar.txt")) if metar]
+
+def parsed_tafs() -> list[TAFConditions]:
+  configure_parse_cache(0)
+  return [render_taf(taf) for taf in (parse_taf_conditions(raw, REFERENCE) for raw in load_corpus("taf.txt")) if taf]
+
+@benchmark("parse_metar_conditions")
+def bench_parse_metar():
+  reports = load_corpus("metar.txt")
+  configure_parse_cache(0)
+  return lambda: [parse_metar_conditions(raw, REFERENCE) for raw in reports], len(reports)
+
+@benchmark("parse_metar_conditions_cached")
+def bench_parse_metar_cached():
+  reports = load_corpus("metar.txt")
+  configure_parse_cache(len(reports))
+  for raw in reports:
+    parse_metar_conditions(raw, REFERENCE)
+  return lambda: [parse_metar_conditions(raw, REFERENCE) for raw in reports], len(reports)
+
+@benchmark("parse_taf_conditions")
+def bench_parse_taf():
+  reports = load_corpus("taf.txt")
+  configure_parse_cache(0)
+  return lambda: [parse_taf_conditions(raw, REFERENCE) for raw in reports], len(reports)
+
+@benchmark("validity_to_datetimes")
+def bench_validity():
+  validities = [
+    trend.validity
+    for raw in load_corpus("taf.txt")
+    for trend in taf_parser.parse(raw).trends
+    if getattr(trend, "validity", None) is not None and hasattr(trend.validity, "end_day")
+  ]
+  return lambda: [validity_to_datetimes(validity, REFERENCE) for validity in validities], len(validities)
+
+@benchmark("metar_to_dict")
+def bench_metar_to_dict():
+  conditions = parsed_metars()
+  return lambda: [metar.to_dict() for metar in conditions], len(conditions)
+
+@benchmark("metar_from_dict")
+def bench_metar_from_dict():
+  docs = [metar.to_dict() for metar in parsed_metars()]
+  return lambda: [MetarConditions.from_dict(doc) for doc in docs], len(docs)
+
+@benchmark("taf_to_dict")
+def bench_taf_to_dict():
+  conditions = parsed_tafs()
+  return lambda: [taf.to_dict() for taf in conditions], len(conditions)
+
+@benchmark("taf_from_dict")
+def bench_taf_from_dict():
+  docs = [taf.to_dict() for taf in parsed_tafs()]
+  return lambda: [TAFConditions.from_dict(doc) for doc in docs], len(docs)
+
+@benchmark("createMetarReponse")
+def bench_metar_response():
+  from ReportApi import createMetarReponse
+  conditions = parsed_metars()
+  return lambda: [createMetarReponse(metar) for metar in conditions], len(conditions)
+
+@benchmark("create_taf_response")
+def bench_taf_response():
+  from ReportApi import create_taf_response
+  conditions = parsed_tafs()
+  return lambda: [create_taf_response(taf) for taf in conditions], len(conditions)
+
+@functools.cache
+def api_client():
+  """
+  ReportApi on mongomock with the parsed corpus and without response cache.
+  The lifespan (indexes and change feed) is not started.
+  """
+  from mongomock_motor import AsyncMongoMockClient
+  from fastapi.testclient import TestClient
+  import ReportApi
+  client = AsyncMongoMockClient()
+  ReportApi.client = client
+  ReportApi.db = client["aviation"]
+  ReportApi.latest_cache.size = 0
+  stations = set()
+  for collection_name, conditions in (("metar_conditions", parsed_metars()), ("taf_conditions", parsed_tafs())):
+    # Unique like the station_issueTime index
+    docs = {(c.station, c.issueTime): c.to_dict() for c in conditions}
+    stations.update(station for station, _ in docs)
+    asyncio.run(ReportApi.db[collection_name].insert_many(list(docs.values())))
+  return TestClient(ReportApi.app), sorted(stations)
+
+@benchmark("api_metar_query_latest")
+def bench_api_metar_latest():
+  client, stations = api_client()
+  body = {"stations": stations[:20]}
+  return lambda: client.post("/metar/query", json=body).raise_for_status(), 1
+
+@benchmark("api_metar_query_history")
+def bench_api_metar_history():
+  client, stations = api_client()
+  body = {"stations": stations[:20], "startTime": "2024-03-01T00:00:00"}
+  return lambda: client.post("/metar/query", json=body).raise_for_status(), 1
+
+@benchmark("api_taf_query_latest")
+def bench_api_taf_latest():
+  client, stations = api_client()
+  body = {"stations": stations[:20]}
+  return lambda: client.post("/taf/query", json=body).raise_for_status(), 1
+
+class StubUpstream(BaseHTTPRequestHandler):
+  """
+  Answers the aviationweather.gov batch requests with the latest corpus
+  report of every requested station.
+  """
+  reports = {}
+
+  def log_message(self, *args):
+    pass
+
+  def do_GET(self):
+    url = urlparse(self.path)
+    product = "METAR" if url.path.endswith("metar") else "TAF"
+    ids = parse_qs(url.query)["ids"][0].split(",")
+    body = "".join(self.reports[product][code] + "\n" for code in ids if code in self.reports[product]).encode()
+    self.send_response(200)
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+@benchmark("scraper_cycle")
+def bench_scraper_cycle():
+  import mongomock
+  import Scraper
+  StubUpstream.reports = {
+    "METAR": {raw.split()[0]: raw for raw in load_corpus("metar.txt")},
+    "TAF": {raw.split()[2 if raw.split()[1] in ("AMD", "COR") else 1]: raw for raw in load_corpus("taf.txt")},
+  }
+  server = ThreadingHTTPServer(("127.0.0.1", 0), StubUpstream)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  Scraper.api_base_url = f"http://127.0.0.1:{server.server_port}"
+  db = mongomock.MongoClient()["aviation"]
+  Scraper.db = db
+  Scraper.metar_writer.collection = db["metar_conditions"]
+  Scraper.taf_writer.collection = db["taf_conditions"]
+  Scraper.scrape_state.collection = db["scrape_state"]
+  stations = sorted(StubUpstream.reports["METAR"])
+  db["stations"].insert_many([{"code": code, "name": code} for code in stations])
+  configure_parse_cache(0)
+
+  def cycle():
+    # Forget the hashes main() loads, so every cycle parses and writes all reports
+    db["scrape_state"].delete_many({})
+    Scraper.main()
+  return cycle, len(stations)
+
+def run(name: str, setup, repeat: int) -> dict:
+  try:
+    function, items = setup()
+  except ImportError as e:
+    return {"skipped": f"missing dependency: {e.name}"}
+  function()  # warm up
+  timings = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    function()
+    timings.append(time.perf_counter() - start)
+  return {
+    "items": items,
+    "min_s": min(timings),
+    "median_s": statistics.median(timings),
+    "per_item_us": min(timings) / items * 1e6,
+  }
+
+def current_commit() -> str:
+  try:
+    return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                          check=True, cwd=BENCHMARK_DIR).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return "unknown"
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+  parser.add_argument("--filter", default="", help="only run benchmarks containing this text")
+  parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark, the fastest counts")
+  parser.add_argument("--output", help="result file, defaults to benchmarks/results/<commit>.json")
+  args = parser.parse_args()
+
+  commit = current_commit()
+  corpus = corpus_source()
+  print(f"Corpus: {corpus}")
+  results = {}
+  for name, setup in BENCHMARKS.items():
+    if args.filter not in name:
+      continue
+    results[name] = result = run(name, setup, args.repeat)
+    if "skipped" in result:
+      print(f"{name:<32} skipped, {result['skipped']}")
+    else:
+      print(f"{name:<32} {result['per_item_us']:>10.1f} us/item {result['min_s'] * 1000:>10.1f} ms ({result['items']} items)")
+
+  output = args.output or os.path.join(BENCHMARK_DIR, "results", f"{commit}.json")
+  os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+  with open(output, "w") as f:
+    json.dump({
+      "commit": commit,
+      "corpus": corpus,
+      "date": datetime.now().isoformat(timespec="seconds"),
+      "python": platform.python_version(),
+      "machine": platform.machine(),
+      "processor": platform.processor(),
+      "benchmarks": results,
+    }, f, indent=2)
+  print(f"Wrote {output}")
@@ -0,0 +1,83 @@
+import hashlib
+import http.server
+import os
+import sys
+import threading
+import urllib.parse
+import mongomock
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+# Scraper refuses to start without it, the client never connects because every collection is replaced
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+
+class StubUpstream(http.server.ThreadingHTTPServer):
+  """
+  Local stand-in for aviationweather.gov answering the batch requests of
+  the scraper from the reports dicts, with an ETag per response body.
+  """
+  def __init__(self):
+    super().__init__(("127.0.0.1", 0), StubHandler)
+    self.reports = {"metar": {}, "taf": {}}
+    self.requests = []
+
+  @property
+  def url(self) -> str:
+    return f"http://127.0.0.1:{self.server_port}"
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+  def log_message(self, *args):
+    pass
+
+  def do_GET(self):
+    url = urllib.parse.urlparse(self.path)
+    product = url.path.rsplit("/", 1)[-1]
+    ids = urllib.parse.parse_qs(url.query)["ids"][0].split(",")
+    self.server.requests.append((product, ids, self.headers.get("If-None-Match")))
+    reports = self.server.reports[product]
+    body = "".join(reports[code] + "\n" for code in ids if code in reports).encode("utf-8")
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    if self.headers.get("If-None-Match") == etag:
+      self.send_response(304)
+      self.send_header("ETag", etag)
+      self.end_headers()
+      return
+    self.send_response(200)
+    self.send_header("ETag", etag)
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+@pytest.fixture
+def upstream():
+  server = StubUpstream()
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  yield server
+  server.shutdown()
+  server.server_close()
+
+@pytest.fixture
+def db():
+  return mongomock.MongoClient()["aviation"]
+
+@pytest.fixture
+def scraper(monkeypatch, db, upstream):
+  """
+  The Scraper module writing to mongomock and fetching from the stub upstream.
+  """
+  import Scraper
+  monkeypatch.setattr(Scraper, "db", db)
+  monkeypatch.setattr(Scraper, "api_base_url", upstream.url)
+  monkeypatch.setattr(Scraper, "report_archive", None)
+  monkeypatch.setattr(Scraper.metar_writer, "collection", db["metar_conditions"])
+  monkeypatch.setattr(Scraper.taf_writer, "collection", db["taf_conditions"])
+  monkeypatch.setattr(Scraper.scrape_state, "collection", db["scrape_state"])
+  monkeypatch.setattr(Scraper.scrape_state, "entries", {})
+  monkeypatch.setattr(Scraper.scrape_state, "dirty", set())
+  monkeypatch.setattr(Scraper, "metar_series_writer", None)
+  monkeypatch.setattr(Scraper, "writers", [Scraper.metar_writer, Scraper.taf_writer])
+  for writer in Scraper.writers:
+    writer.reset()
+  Scraper.scrape_state.reset()
+  return Scraper
@@ -0,0 +1,43 @@
+from datetime import datetime
+import pytest
+from fastapi.testclient import TestClient
+import ReportApi
+
+@pytest.fixture
+def buckets(monkeypatch):
+  """
+  Records the time range of the aggregation, mongomock has no $dateTrunc.
+  """
+  calls = []
+  async def aggregate_metar_buckets(stations, start_time, end_time, unit, bin_size):
+    calls.append((start_time, end_time))
+    return [{"_id": {"station": "LOWW", "start": start_time}, "count": 1,
+             **{f"{name}{stat}": 1 for name in ReportApi.AGGREGATE_FIELDS for stat in ("Min", "Max", "Mean", "Count")}}]
+  monkeypatch.setattr(ReportApi, "aggregate_metar_buckets", aggregate_metar_buckets)
+  return calls
+
+def aggregate(body: dict):
+  return TestClient(ReportApi.app).post("/metar/aggregate", json={"stations": ["LOWW"], **body})
+
+@pytest.mark.parametrize("interval", ["00h", "0m", "x", "367d"])
+def test_invalid_interval_is_rejected(buckets, interval):
+  assert aggregate({"startTime": "2024-03-01T00:00:00", "interval": interval}).status_code == 400
+
+def test_time_zones_are_normalized_to_utc(buckets):
+  response = aggregate({"startTime": "2024-03-01T00:00:00Z", "endTime": "2024-03-01T06:00:00+02:00"})
+  assert response.status_code == 200
+  assert buckets == [(datetime(2024, 3, 1, 0, 0), datetime(2024, 3, 1, 4, 0))]
+
+@pytest.mark.parametrize("body", [
+  {"startTime": "2024-03-01T00:00:00Z", "interval": "day"},
+  {"startTime": "2024-03-01T00:00:00Z", "endTime": "2024-03-02T00:00:00"},
+  {"startTime": "2024-03-01T00:00:00", "endTime": "2024-03-02T00:00:00Z"},
+])
+def test_mixed_time_zones(buckets, body):
+  assert aggregate(body).status_code == 200
+  assert all(value.tzinfo is None for call in buckets for value in call)
+
+@pytest.mark.parametrize("end", ["2024-03-01T00:00:00", "2024-02-29T23:00:00"])
+def test_empty_range_is_rejected(buckets, end):
+  assert aggregate({"startTime": "2024-03-01T00:00:00", "endTime": end}).status_code == 400
+  assert buckets == []
@@ -0,0 +1,43 @@
+from datetime import datetime
+from pymongo.errors import AutoReconnect
+from MetarTaf import parse_metar_conditions
+
+REFERENCE = datetime(2024, 3, 18, 18, 0)
+
+def metar(station: str, minute: int):
+  return parse_metar_conditions(f"{station} 18{17 + minute // 60:02d}{minute % 60:02d}Z 28008KT CAVOK 12/05 Q1018", REFERENCE)
+
+def test_counts_upserts_and_matches(scraper, db):
+  writer = scraper.ConditionWriter(db["metar_conditions"], batch_size=2)
+  written = []
+  for station in ("LOWW", "LOWL", "EDDM"):
+    writer.add(metar(station, 50), lambda station=station: written.append(station))
+  # Two full batches are written right away, the third report waits for flush
+  assert writer.upserted == 2 and written == ["LOWW", "LOWL"]
+  writer.flush()
+  assert (writer.matched, writer.upserted, writer.modified, writer.errors) == (0, 3, 0, 0)
+  writer.add(metar("LOWW", 50))
+  writer.add(metar("LOWW", 80))
+  writer.flush()
+  assert (writer.matched, writer.upserted, writer.modified, writer.errors) == (1, 4, 0, 0)
+  assert writer.summary() == "metar_conditions: matched 1, upserted 4, modified 0, errors 0"
+  assert db["metar_conditions"].count_documents({}) == 4
+
+def test_reset_clears_counts(scraper, db):
+  writer = scraper.ConditionWriter(db["metar_conditions"], batch_size=10)
+  writer.add(metar("LOWW", 50))
+  writer.flush()
+  writer.reset()
+  assert (writer.matched, writer.upserted, writer.modified, writer.errors) == (0, 0, 0, 0)
+
+def test_failed_write_counts_errors_and_skips_callbacks(scraper, db, monkeypatch):
+  collection = db["metar_conditions"]
+  def bulk_write(*args, **kwargs):
+    raise AutoReconnect("connection lost")
+  monkeypatch.setattr(collection, "bulk_write", bulk_write)
+  writer = scraper.ConditionWriter(collection, batch_size=10)
+  written = []
+  writer.add(metar("LOWW", 50), lambda: written.append("LOWW"))
+  writer.add(metar("LOWL", 50), lambda: written.append("LOWL"))
+  writer.flush()
+  assert writer.errors == 2 and written == []
@@ -0,0 +1,29 @@
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from Metrics import MetricsMiddleware
+
+app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+@app.get("/test-events")
+async def events():
+  async def messages():
+    yield "data: 1\n\n"
+  return StreamingResponse(messages(), media_type="text/event-stream")
+
+@app.get("/test-plain")
+async def plain():
+  return {"ok": True}
+
+def count(metric: str, endpoint: str) -> float:
+  return REGISTRY.get_sample_value(metric, {"method": "GET", "endpoint": endpoint, "status": "200"}) or 0
+
+def test_streams_are_kept_out_of_request_latency():
+  client = TestClient(app)
+  assert client.get("/test-events").status_code == 200
+  assert client.get("/test-plain").status_code == 200
+  assert count("api_request_seconds_count", "/test-events") == 0
+  assert count("api_request_seconds_count", "/test-plain") == 1
+  assert REGISTRY.get_sample_value("api_stream_seconds_count", {"endpoint": "/test-events"}) == 1
@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+import pytest
+import MetarTaf
+
+RAW = "LOWW 181750Z 28008KT CAVOK 12/05 Q1018 NOSIG"
+
+@pytest.fixture
+def parse_cache():
+  MetarTaf.configure_parse_cache(100)
+  yield MetarTaf.parse_cache
+  MetarTaf.configure_parse_cache(0)
+
+def test_fetch_times_of_one_day_share_an_entry(parse_cache):
+  fetched = datetime(2024, 3, 18, 17, 55)
+  results = [MetarTaf.parse_metar_conditions(RAW, fetched + timedelta(minutes=minute)) for minute in range(5)]
+  assert {result.issueTime for result in results} == {datetime(2024, 3, 18, 17, 50)}
+  assert parse_cache.stats() == {"size": 1, "maxSize": 100, "hits": 4, "misses": 1, "evictions": 0}
+
+def test_other_date_is_parsed_again(parse_cache):
+  first = MetarTaf.parse_metar_conditions(RAW, datetime(2024, 3, 18, 18, 0))
+  second = MetarTaf.parse_metar_conditions(RAW, datetime(2024, 4, 18, 18, 0))
+  assert (first.issueTime, second.issueTime) == (datetime(2024, 3, 18, 17, 50), datetime(2024, 4, 18, 17, 50))
+  assert parse_cache.stats()["misses"] == 2
+
+def test_cached_results_are_copies(parse_cache):
+  reference = datetime(2024, 3, 18, 18, 0)
+  MetarTaf.parse_metar_conditions(RAW, reference).temperature = 99
+  assert MetarTaf.parse_metar_conditions(RAW, reference).temperature == 12
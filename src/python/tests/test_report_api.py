@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+import ReportApi
+
+START = datetime(2024, 3, 1)
+PROJECTION = {"_id": 0, "station": 1, "issueTime": 1}
+
+@pytest.fixture
+def api_db(monkeypatch):
+  api_db = AsyncMongoMockClient()["aviation"]
+  monkeypatch.setattr(ReportApi, "db", api_db)
+  asyncio.run(api_db["metar_conditions"].insert_many([
+    {"station": station, "issueTime": START + timedelta(hours=hour), "temperature": hour, "dewPoint": 1, "windSpeed": 5}
+    for station in ("LOWW", "LOWL", "EDDM")
+    for hour in range(5)
+  ]))
+  return api_db
+
+def all_pages(collection, stations, limit, start_time=None, end_time=None):
+  pages, cursor = [], None
+  while True:
+    docs, cursor = asyncio.run(ReportApi.find_history_page(collection, stations, start_time, end_time, cursor, limit, PROJECTION))
+    pages.append([(doc["station"], doc["issueTime"].hour) for doc in docs])
+    if not cursor:
+      return pages
+
+def test_pages_follow_station_then_newest_first(api_db):
+  pages = all_pages(api_db["metar_conditions"], ["LOWW", "EDDM"], 3)
+  assert pages == [
+    [("EDDM", 4), ("EDDM", 3), ("EDDM", 2)],
+    [("EDDM", 1), ("EDDM", 0), ("LOWW", 4)],
+    [("LOWW", 3), ("LOWW", 2), ("LOWW", 1)],
+    [("LOWW", 0)],
+  ]
+
+def test_pages_respect_time_range_and_exact_fit(api_db):
+  pages = all_pages(api_db["metar_conditions"], ["LOWL", "LOWL"], 2, START + timedelta(hours=1), START + timedelta(hours=3))
+  assert pages == [[("LOWL", 2), ("LOWL", 1)]]
+
+def test_cursor_round_trip():
+  cursor = ReportApi.encode_cursor("LOWW", START)
+  assert ReportApi.decode_cursor(cursor) == ("LOWW", START)
+
+@pytest.mark.parametrize("cursor", ["zzz", "WzEsICIyMDI0LTAzLTAxVDAwOjAwOjAwIl0="])
+def test_invalid_cursor_is_rejected(cursor):
+  # The second one is an old station index cursor
+  with pytest.raises(HTTPException) as error:
+    ReportApi.decode_cursor(cursor)
+  assert error.value.status_code == 400
+
+@pytest.mark.parametrize("limit, status", [(0, 400), (-1, 400), (2, 200)])
+def test_query_limit(api_db, limit, status):
+  client = TestClient(ReportApi.app)
+  response = client.post("/metar/query", json={"stations": ["LOWW"], "startTime": START.isoformat(), "limit": limit})
+  assert response.status_code == status
+  if status == 200:
+    assert len(response.json()) == 2 and response.headers["X-Next-Cursor"]
+
+def test_revalidation_does_not_serve_a_stale_cached_report(api_db, monkeypatch):
+  monkeypatch.setattr(ReportApi, "latest_cache", ReportApi.ResponseCache(100, 300))
+  client = TestClient(ReportApi.app)
+  first = client.get("/metar/LOWW")
+  assert first.json()["issueTime"] == "2024-03-01T04:00:00"
+  # Stored without the change feed, the cached response is not invalidated
+  asyncio.run(api_db["metar_conditions"].insert_one(
+    {"station": "LOWW", "issueTime": START + timedelta(hours=5), "temperature": 5, "dewPoint": 1, "windSpeed": 5}
+  ))
+  second = client.get("/metar/LOWW", headers={"If-None-Match": first.headers["ETag"]})
+  assert second.status_code == 200
+  assert second.json()["issueTime"] == "2024-03-01T05:00:00"
+  assert second.headers["ETag"] != first.headers["ETag"]
+  third = client.get("/metar/LOWW", headers={"If-None-Match": second.headers["ETag"]})
+  assert third.status_code == 304
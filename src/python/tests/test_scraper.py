@@ -0,0 +1,98 @@
+METARS = {
+  "LOWW": "LOWW 181750Z 28008KT CAVOK 12/05 Q1018 NOSIG",
+  "LOWL": "LOWL 181750Z 25005KT 9999 FEW030 10/04 Q1019",
+  "EDDM": "EDDM 181750Z 24010KT 9999 SCT040 11/03 Q1017",
+}
+TAFS = {
+  "LOWW": "TAF LOWW 181700Z 1818/1924 29010KT CAVOK\n      TEMPO 1818/1820 30015G25KT\n      BECMG 1906/1908 SCT030",
+  "LOWL": "TAF LOWL 181700Z 1818/1918 25005KT 9999 FEW030\n      BECMG 1900/1902 4000 BR",
+}
+
+def last_summary(caplog) -> str:
+  return [record.getMessage() for record in caplog.records if record.getMessage().startswith("Station reports")][-1]
+
+def serve(scraper, upstream, db, stations=("LOWW", "LOWL", "EDDM")):
+  upstream.reports["metar"].update(METARS)
+  upstream.reports["taf"].update(TAFS)
+  db["stations"].insert_many([{"code": code} for code in stations])
+
+def test_split_metar_reports_keeps_newest_per_station(scraper):
+  text = (
+    "LOWW 181750Z 28008KT CAVOK 12/05 Q1018\n"
+    "\n"
+    "METAR LOWL 181750Z 25005KT 9999 FEW030 10/04 Q1019\n"
+    "LOWW 181720Z 27006KT CAVOK 13/05 Q1018\n"
+    "SPECI COR EDDM 181755Z 24010KT 4000 BR 11/03 Q1017\n"
+  )
+  reports = scraper.split_metar_reports(text)
+  assert reports == {
+    "LOWW": "LOWW 181750Z 28008KT CAVOK 12/05 Q1018",
+    "LOWL": "METAR LOWL 181750Z 25005KT 9999 FEW030 10/04 Q1019",
+    "EDDM": "SPECI COR EDDM 181755Z 24010KT 4000 BR 11/03 Q1017",
+  }
+
+def test_split_taf_reports_joins_continuation_lines(scraper):
+  text = TAFS["LOWW"] + "\n" + TAFS["LOWL"][len("TAF "):] + "\n" + "TAF AMD EDDM 181800Z 1818/1924 24010KT 9999 SCT040\n"
+  reports = scraper.split_taf_reports(text)
+  assert list(reports) == ["LOWW", "LOWL", "EDDM"]
+  assert reports["LOWW"] == "TAF LOWW 181700Z 1818/1924 29010KT CAVOK      TEMPO 1818/1820 30015G25KT      BECMG 1906/1908 SCT030"
+  assert reports["LOWL"].startswith("TAF LOWL 181700Z")
+  assert reports["EDDM"].startswith("TAF AMD EDDM")
+
+def test_split_reports_of_empty_response(scraper):
+  assert scraper.split_metar_reports("\n") == {}
+  assert scraper.split_taf_reports("") == {}
+
+def test_main_fetches_one_request_per_batch_and_product(scraper, upstream, db, monkeypatch):
+  serve(scraper, upstream, db)
+  monkeypatch.setattr(scraper, "batch_size", 2)
+  scraper.main()
+  assert sorted((product, tuple(ids)) for product, ids, _ in upstream.requests) == [
+    ("metar", ("EDDM",)), ("metar", ("LOWW", "LOWL")), ("taf", ("EDDM",)), ("taf", ("LOWW", "LOWL")),
+  ]
+  assert sorted(doc["station"] for doc in db["metar_conditions"].find()) == ["EDDM", "LOWL", "LOWW"]
+  assert sorted(doc["station"] for doc in db["taf_conditions"].find()) == ["LOWL", "LOWW"]
+
+def test_unchanged_reports_are_skipped(scraper, upstream, db, caplog):
+  caplog.set_level("INFO")
+  serve(scraper, upstream, db)
+  scraper.main()
+  upstream.reports["metar"]["LOWW"] = "LOWW 181820Z 29010KT CAVOK 11/05 Q1019 NOSIG"
+  # Without validators every response is a full 200, only the report hashes tell what changed
+  db["scrape_state"].delete_many({"_id": {"$regex": "^url:"}})
+  scraper.main()
+  assert last_summary(caplog) == "Station reports skipped 4, parsed 1, written 1"
+  assert db["metar_conditions"].count_documents({"station": "LOWW"}) == 2
+  assert db["metar_conditions"].count_documents({}) == 4
+
+def test_scrape_state_skips_known_hash(scraper, db):
+  state = scraper.ScrapeState(db["scrape_state"])
+  state.remember_report("METAR", "LOWW", METARS["LOWW"])
+  state.save()
+  state = scraper.ScrapeState(db["scrape_state"])
+  state.load()
+  assert state.is_unchanged("METAR", "LOWW", METARS["LOWW"])
+  assert not state.is_unchanged("METAR", "LOWW", METARS["LOWW"] + " RMK")
+  assert not state.is_unchanged("TAF", "LOWW", METARS["LOWW"])
+
+def test_not_modified_response_skips_the_batch(scraper, upstream, db, caplog):
+  caplog.set_level("INFO")
+  serve(scraper, upstream, db)
+  scraper.main()
+  first = len(upstream.requests)
+  scraper.main()
+  conditional = upstream.requests[first:]
+  assert all(etag for _, _, etag in conditional)
+  assert last_summary(caplog) == "Station reports skipped 6, parsed 0, written 0"
+  assert db["metar_conditions"].count_documents({}) == 3
+
+def test_changed_response_sends_and_replaces_validator(scraper, upstream, db):
+  serve(scraper, upstream, db, stations=("LOWW",))
+  scraper.main()
+  old = db["scrape_state"].find_one({"_id": {"$regex": "^url:.*/metar"}})["etag"]
+  upstream.reports["metar"]["LOWW"] = "LOWW 181820Z 29010KT CAVOK 11/05 Q1019 NOSIG"
+  scraper.main()
+  sent = [etag for product, _, etag in upstream.requests if product == "metar"]
+  assert sent == [None, old]
+  assert db["scrape_state"].find_one({"_id": {"$regex": "^url:.*/metar"}})["etag"] != old
+  assert db["metar_conditions"].count_documents({"station": "LOWW"}) == 2
@@ -0,0 +1,28 @@
+from datetime import datetime
+import pytest
+from MetarTaf import parse_taf_uncached
+from Retention import compact_tafs
+
+@pytest.mark.parametrize("raw, reference, start, end", [
+  ("TAF LOWW 301100Z 3012/0118 29010KT CAVOK", datetime(2024, 4, 30, 11), datetime(2024, 4, 30, 12), datetime(2024, 5, 1, 18)),
+  ("TAF LOWW 281100Z 2812/0118 29010KT CAVOK", datetime(2023, 2, 28, 11), datetime(2023, 2, 28, 12), datetime(2023, 3, 1, 18)),
+  ("TAF LOWW 311100Z 3112/0118 29010KT CAVOK", datetime(2024, 12, 31, 11), datetime(2024, 12, 31, 12), datetime(2025, 1, 1, 18)),
+  ("TAF LOWW 181700Z 1818/1924 29010KT CAVOK", datetime(2024, 3, 18, 17), datetime(2024, 3, 18, 18), datetime(2024, 3, 20, 0)),
+])
+def test_validity_across_month_end(raw, reference, start, end):
+  taf = parse_taf_uncached(raw, reference)
+  assert (taf.validityStart, taf.validityEnd) == (start, end)
+
+def test_trend_validity_across_month_end():
+  taf = parse_taf_uncached("TAF LOWW 301100Z 3012/0118 29010KT CAVOK TEMPO 3022/0104 4000 BR", datetime(2024, 4, 30, 11))
+  assert (taf.trends[0].validityStart, taf.trends[0].validityEnd) == (datetime(2024, 4, 30, 22), datetime(2024, 5, 1, 4))
+
+def test_compaction_keeps_routine_tafs_of_consecutive_days_at_month_end(db):
+  reference = datetime(2024, 4, 30, 11)
+  for raw in ("TAF LOWW 301100Z 3012/0118 29010KT CAVOK",
+              "TAF AMD LOWW 301400Z 3014/0118 29015KT 9999 SCT030",
+              "TAF LOWW 011100Z 0112/0218 29010KT CAVOK"):
+    db.taf_conditions.insert_one(parse_taf_uncached(raw, reference).to_dict())
+  # Only the routine TAF of April 30 is superseded, by its amendment
+  assert compact_tafs(db, datetime(2024, 5, 3)) == 1
+  assert sorted(doc["issueTime"] for doc in db.taf_conditions.find()) == [datetime(2024, 4, 30, 14), datetime(2024, 5, 1, 11)]